@@ -0,0 +1,95 @@
+import math
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Как часто ждущий запрос проверяет, не готово ли значение.
+POLL_INTERVAL = 0.05
+
+
+def _lock_key(key):
+    return f'{key}:rebuild-lock'
+
+
+def _store(key, rebuild, timeout, version, grace):
+    started = time.monotonic()
+    value = rebuild()
+    build_time = time.monotonic() - started
+    if value is not None:
+        cache.set(
+            key,
+            (value, version, time.time() + timeout, build_time),
+            timeout + grace,
+        )
+    return value
+
+
+def _rebuild_once(key, rebuild, timeout, version, grace, lock_timeout):
+    """Пересобирает значение, если ключ не пересобирает кто-то другой.
+
+    Возвращает (True, значение) после своей пересборки и (False, None),
+    если блокировку уже держит другой запрос.
+    """
+    lock = _lock_key(key)
+    if not cache.add(lock, True, lock_timeout):
+        return False, None
+    try:
+        return True, _store(key, rebuild, timeout, version, grace)
+    finally:
+        cache.delete(lock)
+
+
+def _wait_for(key, version, lock_timeout):
+    deadline = time.monotonic() + lock_timeout
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None and entry[1] == version:
+            return entry[0]
+        if not cache.has_key(_lock_key(key)):
+            return None
+    return None
+
+
+def get_or_rebuild(key, rebuild, timeout, version=None, grace=None,
+                   lock_timeout=None, beta=None):
+    """Читает значение из кеша, пересобирая его не больше одного раза.
+
+    `rebuild` вызывается без аргументов; если он вернул None, значение
+    не кешируется. Запись считается свежей, пока не истёк `timeout` и
+    совпадает `version`. Устаревшую запись пересобирает один запрос под
+    блокировкой, остальные в течение `grace` секунд получают старое
+    значение. При `beta` > 0 запись иногда пересобирается чуть раньше
+    срока, и чем дольше сборка, тем раньше (XFetch).
+    """
+    if grace is None:
+        grace = settings.CACHE_STALE_GRACE
+    if lock_timeout is None:
+        lock_timeout = settings.CACHE_REBUILD_LOCK_TIMEOUT
+    if beta is None:
+        beta = settings.CACHE_EARLY_REFRESH_BETA
+    entry = cache.get(key)
+    if entry is not None:
+        value, stored_version, expires, build_time = entry
+        now = time.time()
+        early = beta > 0 and (
+            now - build_time * beta * math.log(1 - random.random())
+            >= expires
+        )
+        if stored_version == version and now < expires and not early:
+            return value
+        rebuilt, new_value = _rebuild_once(
+            key, rebuild, timeout, version, grace, lock_timeout
+        )
+        return new_value if rebuilt else value
+    rebuilt, value = _rebuild_once(
+        key, rebuild, timeout, version, grace, lock_timeout
+    )
+    if rebuilt:
+        return value
+    value = _wait_for(key, version, lock_timeout)
+    if value is not None:
+        return value
+    return _store(key, rebuild, timeout, version, grace)
@@ -0,0 +1,33 @@
+"""Персональные вставки в страницы, закешированные для всех сразу.
+
+Страница рендерится один раз с метками вместо зависящих от
+пользователя фрагментов (шапка, кнопки, форма комментария), а при
+каждом запросе метки заменяются фрагментами, отрендеренными для
+текущего пользователя.
+"""
+import base64
+import json
+import re
+
+from django.template.loader import render_to_string
+
+HOLE = re.compile(rb'<!--hole:([A-Za-z0-9_-]+=*)-->')
+
+
+def make_marker(template_name, params):
+    payload = json.dumps([template_name, params]).encode()
+    return f'<!--hole:{base64.urlsafe_b64encode(payload).decode()}-->'
+
+
+def render_hole(request, template_name, params):
+    return render_to_string(template_name, params, request=request)
+
+
+def fill_holes(request, content):
+    """Заменяет метки в `content` фрагментами для `request.user`."""
+    def replace(match):
+        template_name, params = json.loads(
+            base64.urlsafe_b64decode(match.group(1))
+        )
+        return render_hole(request, template_name, params).encode()
+    return HOLE.sub(replace, content)
@@ -0,0 +1,81 @@
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.cache_backends import SQLiteCache
+
+
+def _backends(directory):
+    return {
+        'locmem': lambda: LocMemCache('benchmark', {}),
+        'filebased': lambda: FileBasedCache(
+            os.path.join(directory, 'filebased'), {}
+        ),
+        'sqlite': lambda: SQLiteCache(
+            os.path.join(directory, 'cache.sqlite3'), {}
+        ),
+    }
+
+
+def _worker(factory, seed, operations, keys, payload, results):
+    cache = factory()
+    rng = random.Random(seed)
+    hits = 0
+    started = time.perf_counter()
+    for _ in range(operations):
+        # Популярные страницы запрашиваются чаще остальных.
+        key = f'page:{int(rng.paretovariate(1.2)) % keys}'
+        if cache.get(key) is None:
+            cache.set(key, payload, 300)
+        else:
+            hits += 1
+    results.put((time.perf_counter() - started, hits))
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает LocMemCache, FileBasedCache и SQLiteCache на нагрузке '
+        'из нескольких процессов, читающих общий набор страниц.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--operations', type=int, default=5000)
+        parser.add_argument('--keys', type=int, default=500)
+        parser.add_argument('--payload', type=int, default=20 * 1024,
+                            help='Размер закешированной страницы в байтах.')
+
+    def handle(self, *args, **options):
+        payload = os.urandom(options['payload'])
+        context = multiprocessing.get_context('fork')
+        self.stdout.write(
+            f'{"backend":<10} {"ops/s":>10} {"hit rate":>9}'
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            for name, factory in _backends(directory).items():
+                results = context.Queue()
+                workers = [
+                    context.Process(target=_worker, args=(
+                        factory, seed, options['operations'],
+                        options['keys'], payload, results,
+                    ))
+                    for seed in range(options['processes'])
+                ]
+                for worker in workers:
+                    worker.start()
+                stats = [results.get() for _ in workers]
+                for worker in workers:
+                    worker.join()
+                elapsed = max(seconds for seconds, _ in stats)
+                total = options['operations'] * len(workers)
+                hits = sum(hit for _, hit in stats)
+                self.stdout.write(
+                    f'{name:<10} {total / elapsed:>10.0f} '
+                    f'{hits / total:>9.1%}'
+                )
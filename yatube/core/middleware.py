@@ -0,0 +1,94 @@
+import json
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from core import timing
+from core.nplusone import QueryRepeatDetector
+
+logger = logging.getLogger('core.timing')
+
+# Имя метрики в Server-Timing и что считает её счётчик. Заголовки
+# HTTP передаются в latin-1, поэтому описания по-английски.
+METRICS = {
+    'db': 'queries',
+    'template': 'renders',
+    'cache': 'reads',
+    'thumbnail': 'thumbnails',
+}
+
+
+class ServerTimingMiddleware:
+    """Отдаёт время БД, шаблонов, кеша и миниатюр в Server-Timing.
+
+    Замеряется доля запросов `SERVER_TIMING_SAMPLE_RATE`, поэтому
+    middleware можно держать включённым на боевом сервере. Каждый
+    замеренный запрос ещё и пишется в лог `core.timing` строкой JSON.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.SERVER_TIMING_SAMPLE_RATE:
+            return self.get_response(request)
+        started = time.perf_counter()
+        with timing.collect() as timings, \
+                connection.execute_wrapper(timing.database_wrapper):
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+        response['Server-Timing'] = self.header(timings, total)
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            **{
+                f'{name}_ms': round(timings.durations[name] * 1000, 2)
+                for name in METRICS
+            },
+            **{
+                f'{name}_count': timings.counts[name]
+                for name in (
+                    *METRICS, 'cache_hit', 'cache_miss', 'thumbnail_created',
+                )
+            },
+        }))
+        return response
+
+    def header(self, timings, total):
+        parts = []
+        for name, unit in METRICS.items():
+            if name not in timings.counts:
+                continue
+            description = f'{timings.counts[name]} {unit}'
+            if name == 'cache':
+                description += (
+                    f' hit={timings.counts["cache_hit"]}'
+                    f' miss={timings.counts["cache_miss"]}'
+                )
+            parts.append(
+                f'{name};dur={timings.durations[name] * 1000:.2f};'
+                f'desc="{description}"'
+            )
+        parts.append(f'total;dur={total * 1000:.2f}')
+        return ', '.join(parts)
+
+
+class QueryRepeatMiddleware:
+    """Ищет N+1 в доле запросов `NPLUSONE_SAMPLE_RATE`.
+
+    Сами находки пишет `QueryRepeatDetector` в лог `core.nplusone`.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.NPLUSONE_SAMPLE_RATE:
+            return self.get_response(request)
+        with connection.execute_wrapper(QueryRepeatDetector(request)):
+            return self.get_response(request)
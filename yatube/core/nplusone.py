@@ -0,0 +1,85 @@
+"""Поиск N+1 по повторяющейся форме SQL-запросов внутри запроса.
+
+Каждый запрос к БД сводится к отпечатку без литералов и длины списков
+IN. Если один отпечаток встретился больше `threshold` раз, в лог
+`core.nplusone` один раз пишется представление, строка шаблона и
+стек Python, из которых пришёл лишний запрос.
+"""
+import json
+import logging
+import os
+import re
+import sys
+import traceback
+from collections import Counter
+
+from django.conf import settings
+from django.template.base import Node
+
+logger = logging.getLogger('core.nplusone')
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+IN_LISTS = re.compile(r'\bIN\s*\((?:\s*\?\s*,?)+\)', re.IGNORECASE)
+SPACES = re.compile(r'\s+')
+# Кадры стека из этих каталогов в отчёт не попадают.
+LIBRARY_PATHS = tuple(
+    path for path in sys.path if 'site-packages' in path
+) + (os.path.dirname(os.__file__),)
+
+
+def fingerprint(sql):
+    """Форма запроса: литералы и параметры заменены на `?`."""
+    sql = LITERALS.sub('?', sql.replace('%s', '?'))
+    sql = IN_LISTS.sub('IN (...)', sql)
+    return SPACES.sub(' ', sql).strip()
+
+
+def template_position():
+    """Шаблон и строка узла, который сейчас рендерится, или None."""
+    frame = sys._getframe()
+    while frame is not None:
+        node = frame.f_locals.get('self')
+        context = frame.f_locals.get('context')
+        if isinstance(node, Node) and context is not None:
+            template = getattr(context, 'template', None)
+            if template is not None and node.token is not None:
+                return f'{template.origin.name}:{node.token.lineno}'
+        frame = frame.f_back
+    return None
+
+
+def project_stack():
+    return [
+        f'{frame.filename}:{frame.lineno} in {frame.name}'
+        for frame in traceback.extract_stack()[:-2]
+        if not frame.filename.startswith(LIBRARY_PATHS)
+    ]
+
+
+class QueryRepeatDetector:
+    """Обёртка для `connection.execute_wrapper`, ищущая N+1."""
+
+    def __init__(self, request, threshold=None):
+        self.request = request
+        if threshold is None:
+            threshold = settings.NPLUSONE_THRESHOLD
+        self.threshold = threshold
+        self.counts = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        shape = fingerprint(sql)
+        self.counts[shape] += 1
+        if self.counts[shape] == self.threshold + 1:
+            self.report(shape)
+        return execute(sql, params, many, context)
+
+    def report(self, shape):
+        match = getattr(self.request, 'resolver_match', None)
+        logger.warning(json.dumps({
+            'view': match.view_name if match else None,
+            'path': self.request.path,
+            'query': shape,
+            'repeats': self.counts[shape],
+            'template': template_position(),
+            'stack': project_stack(),
+        }, ensure_ascii=False))
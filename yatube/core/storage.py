@@ -0,0 +1,67 @@
+"""Файловое хранилище, в котором файлы называются по содержимому."""
+import hashlib
+import os
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, раскладывающее файлы по SHA-256 их содержимого.
+
+    Файл из `posts/image.gif` ложится в `posts/ab/<sha256>.gif`, поэтому
+    одинаковые загрузки занимают на диске один файл, а не копии с
+    суффиксами, и делят миниатюры sorl, которые называются по имени
+    исходника. Удалять файл, на который больше никто не ссылается, —
+    забота вызывающего кода.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Имя задаёт содержимое, а не загрузка, переименовывать нечего.
+        return name
+
+    @staticmethod
+    def content_name(name, content):
+        """Имя, под которым хранится `content`, загруженный как `name`."""
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(directory, digest[:2], digest + extension)
+
+    def _save(self, name, content):
+        name = self.content_name(name, content)
+        try:
+            # Повторная загрузка освежает время изменения файла, и
+            # `delete_stale` его уже не удалит.
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            # Файл пишется под временным именем и переименовывается:
+            # одновременные загрузки одного содержимого не мешают друг
+            # другу, а читатели не видят файл недописанным.
+            temporary = super()._save(f'{name}.{uuid.uuid4().hex}', content)
+            os.replace(self.path(temporary), self.path(name))
+        return name
+
+    def delete_stale(self, name, cutoff):
+        """Удаляет файл, если его не загружали заново после `cutoff`.
+
+        Возвращает размер удалённого файла или None, если файла нет или
+        он снова нужен. Файл сначала атомарно убирается в сторону и
+        проверяется уже там: загрузка, которая успела его освежить,
+        оставит его на месте, а опоздавшая не найдёт и запишет заново.
+        """
+        path = self.path(name)
+        aside = f'{path}.{uuid.uuid4().hex}.stale'
+        try:
+            os.rename(path, aside)
+        except FileNotFoundError:
+            return None
+        stat = os.stat(aside)
+        if self._datetime_from_timestamp(stat.st_mtime) > cutoff:
+            os.replace(aside, path)
+            return None
+        os.remove(aside)
+        return stat.st_size
@@ -0,0 +1,19 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from core.holes import make_marker, render_hole
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, template_name, **params):
+    """Вставляет фрагмент, зависящий от пользователя.
+
+    Фрагмент получает только `params` и контекст-процессоры. При
+    рендере страницы для общего кеша вместо него выводится метка.
+    """
+    request = context.get('request')
+    if getattr(request, 'punch_holes', False):
+        return mark_safe(make_marker(template_name, params))
+    return render_hole(request, template_name, params)
@@ -0,0 +1,71 @@
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from core.cache import _lock_key, get_or_rebuild
+
+
+@override_settings(CACHE_EARLY_REFRESH_BETA=0)
+class GetOrRebuildTest(SimpleTestCase):
+    key = 'test:get-or-rebuild'
+
+    def setUp(self):
+        cache.delete_many([self.key, _lock_key(self.key)])
+        self.calls = 0
+
+    def rebuild(self, value='fresh', delay=0):
+        def build():
+            self.calls += 1
+            time.sleep(delay)
+            return value
+        return build
+
+    def test_fresh_value_is_not_rebuilt(self):
+        get_or_rebuild(self.key, self.rebuild(), 60, version=1)
+        value = get_or_rebuild(self.key, self.rebuild('new'), 60, version=1)
+        self.assertEqual(value, 'fresh')
+        self.assertEqual(self.calls, 1)
+
+    def test_new_version_is_rebuilt(self):
+        get_or_rebuild(self.key, self.rebuild(), 60, version=1)
+        value = get_or_rebuild(self.key, self.rebuild('new'), 60, version=2)
+        self.assertEqual(value, 'new')
+
+    def test_stale_value_served_while_rebuild_is_locked(self):
+        """Пока страницу пересобирают, остальные получают старую."""
+        get_or_rebuild(self.key, self.rebuild('old'), 60, version=1)
+        cache.add(_lock_key(self.key), True, 10)
+        value = get_or_rebuild(self.key, self.rebuild('new'), 60, version=2)
+        self.assertEqual(value, 'old')
+        self.assertEqual(self.calls, 1)
+
+    def test_concurrent_cold_misses_rebuild_once(self):
+        """Одновременные промахи по пустому ключу собирают значение раз."""
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(get_or_rebuild(
+                self.key, self.rebuild(delay=0.2), 60, version=1
+            )))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['fresh'] * 5)
+        self.assertEqual(self.calls, 1)
+
+    def test_none_is_not_cached(self):
+        get_or_rebuild(self.key, self.rebuild(None), 60)
+        self.assertIsNone(cache.get(self.key))
+
+    @override_settings(CACHE_EARLY_REFRESH_BETA=10000)
+    def test_early_refresh_rebuilds_before_expiry(self):
+        """Долгая сборка заставляет обновить запись раньше срока."""
+        get_or_rebuild(self.key, self.rebuild(delay=0.01), 60)
+        with mock.patch('core.cache.random.random', return_value=0.5):
+            get_or_rebuild(self.key, self.rebuild(), 60)
+        self.assertEqual(self.calls, 2)
@@ -0,0 +1,114 @@
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+from django.test import SimpleTestCase
+
+from core.cache_backends import SQLiteCache
+
+
+def _increment(location, times):
+    cache = SQLiteCache(location, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.location = os.path.join(self.directory.name, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_basic_operations(self):
+        """Чтение, запись, удаление и пакетные операции."""
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(self.cache.get_many(['a', 'b', 'c']),
+                         {'a': 1, 'b': 2})
+        self.cache.delete('a')
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.incr('b', 5), 7)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_values_are_shared_between_instances(self):
+        """Запись одного экземпляра видна другому, как соседнему процессу."""
+        self.cache.set('shared', 'page')
+        self.assertEqual(self.make_cache().get('shared'), 'page')
+
+    def test_expired_values_are_missing(self):
+        self.cache.set('short', 'value', 0.01)
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertTrue(self.cache.add('short', 'new'))
+        self.assertEqual(self.cache.get('short'), 'new')
+
+    def test_add_and_get_or_set_are_atomic(self):
+        """add не перезаписывает живой ключ, get_or_set отдаёт сохранённое."""
+        self.assertTrue(self.cache.add('key', 'first'))
+        self.assertFalse(self.make_cache().add('key', 'second'))
+        self.assertEqual(self.cache.get_or_set('key', 'third'), 'first')
+        self.assertEqual(self.cache.get_or_set('other', lambda: 'x'), 'x')
+
+    def test_least_recently_used_entries_are_culled(self):
+        cache = self.make_cache(MAX_ENTRIES=3, CULL_FREQUENCY=3,
+                                ACCESS_RESOLUTION=0)
+        for number in range(3):
+            cache.set(f'key{number}', number)
+            time.sleep(0.01)
+        cache.get('key0')
+        cache.set('key3', 3)
+        self.assertIsNone(cache.get('key1'))
+        self.assertEqual(cache.get('key0'), 0)
+        self.assertEqual(cache.get('key3'), 3)
+
+    def test_read_does_not_wait_for_writer(self):
+        """Отметка чтения не ждёт, пока другой процесс держит запись."""
+        cache = self.make_cache(ACCESS_RESOLUTION=0, BUSY_TIMEOUT=2)
+        cache.set('key', 'value')
+        writer = sqlite3.connect(self.location, isolation_level=None)
+        writer.execute('BEGIN IMMEDIATE')
+        try:
+            started = time.monotonic()
+            self.assertEqual(cache.get('key'), 'value')
+            self.assertLess(time.monotonic() - started, 1)
+        finally:
+            writer.execute('ROLLBACK')
+            writer.close()
+        # После отметки запись снова ждёт блокировку как обычно.
+        self.assertEqual(
+            cache._connection.execute('PRAGMA busy_timeout').fetchone(),
+            (2000,),
+        )
+
+    def test_size_cap_is_respected(self):
+        cache = self.make_cache(MAX_SIZE=3000, ACCESS_RESOLUTION=0)
+        for number in range(10):
+            cache.set(f'key{number}', b'x' * 1000)
+        self.assertEqual(len(cache.get_many(
+            [f'key{number}' for number in range(10)]
+        )), 2)
+
+    def test_incr_is_atomic_across_processes(self):
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=_increment, args=(self.location, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 200)
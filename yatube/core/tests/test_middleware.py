@@ -0,0 +1,85 @@
+import json
+import logging
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, SERVER_TIMING_SAMPLE_RATE=1)
+class ServerTimingMiddlewareTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        Post.objects.create(
+            author=self.user,
+            text='Тестовый текст',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+
+    def metrics(self, response):
+        return {
+            part.split(';')[0]: part
+            for part in response['Server-Timing'].split(', ')
+        }
+
+    def test_header_reports_all_components(self):
+        response = self.client.get(reverse('posts:index'))
+        metrics = self.metrics(response)
+        self.assertEqual(
+            set(metrics),
+            {'db', 'template', 'cache', 'thumbnail', 'total'},
+        )
+        self.assertIn('miss=', metrics['cache'])
+
+    def test_cached_page_is_served_from_cache(self):
+        self.client.get(reverse('posts:index'))
+        metrics = self.metrics(self.client.get(reverse('posts:index')))
+        # Гостю страница отдаётся из кеша без единого запроса к БД.
+        self.assertNotIn('db', metrics)
+        self.assertIn('miss=0', metrics['cache'])
+
+    def test_structured_log_line(self):
+        # assertLogs сам понижает уровень логгера, поэтому сначала
+        # проверяется, что настройки проекта пропускают INFO.
+        logger = logging.getLogger('core.timing')
+        self.assertTrue(logger.isEnabledFor(logging.INFO))
+        self.assertTrue(logger.handlers)
+        with self.assertLogs('core.timing', 'INFO') as logs:
+            self.client.get(reverse('posts:index'))
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['path'], reverse('posts:index'))
+        self.assertEqual(line['status'], 200)
+        self.assertGreater(line['db_count'], 0)
+        self.assertEqual(line['thumbnail_count'], 1)
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+    def test_unsampled_request_has_no_header(self):
+        response = self.client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('Server-Timing'))
@@ -0,0 +1,64 @@
+import json
+
+from django.db import connection
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from core.nplusone import QueryRepeatDetector, fingerprint
+from posts.models import Post, User
+
+
+class FingerprintTest(TestCase):
+    def test_literals_and_in_lists_are_stripped(self):
+        self.assertEqual(
+            fingerprint(
+                'SELECT * FROM "posts_post" WHERE "id" IN (%s, %s, %s) '
+                "AND text = 'a''b'  LIMIT 21"
+            ),
+            'SELECT * FROM "posts_post" WHERE "id" IN (...) '
+            'AND text = ? LIMIT ?',
+        )
+        self.assertEqual(
+            fingerprint('SELECT 1 FROM t4 WHERE "id" IN (%s)'),
+            fingerprint('SELECT 2 FROM t4 WHERE "id" IN (%s, %s)'),
+        )
+
+
+class QueryRepeatDetectorTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for number in range(4):
+            author = User.objects.create_user(username=f'author{number}')
+            Post.objects.create(author=author, text='Пост')
+
+    def detect(self, render):
+        request = RequestFactory().get(reverse('posts:index'))
+        detector = QueryRepeatDetector(request, threshold=2)
+        with self.assertLogs('core.nplusone', 'WARNING') as logs, \
+                connection.execute_wrapper(detector):
+            render()
+        return [json.loads(record.getMessage()) for record in logs.records]
+
+    def test_repeated_query_is_reported_once_with_template_line(self):
+        template = Template(
+            '{% for post in posts %}\n'
+            '{{ post.author.username }}\n'
+            '{% endfor %}'
+        )
+        posts = list(Post.objects.all())
+        reports = self.detect(
+            lambda: template.render(Context({'posts': posts}))
+        )
+        self.assertEqual(len(reports), 1)
+        self.assertIn('auth_user', reports[0]['query'])
+        self.assertTrue(reports[0]['template'].endswith(':2'))
+        self.assertTrue(any(
+            'test_nplusone.py' in frame for frame in reports[0]['stack']
+        ))
+
+    @override_settings(NPLUSONE_SAMPLE_RATE=1)
+    def test_constant_feed_is_not_reported(self):
+        with self.assertRaises(AssertionError):
+            with self.assertLogs('core.nplusone', 'WARNING'):
+                self.client.get(reverse('posts:index'))
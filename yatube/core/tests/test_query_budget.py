@@ -0,0 +1,118 @@
+"""Бюджет запросов к БД для каждого именованного маршрута.
+
+Каждый маршрут открывается анонимно и от имени пользователя на малом
+и на большом наборе данных. Тест падает, если число запросов растёт
+вместе с данными или превышает бюджет из `query_budgets.json`.
+
+После намеренного изменения бюджета файл можно перезаписать:
+QUERY_BUDGET_RECORD=1 python manage.py test core.tests.test_query_budget
+"""
+import json
+import os
+from importlib import import_module
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+BUDGETS_PATH = os.path.join(os.path.dirname(__file__), 'query_budgets.json')
+URLCONFS = ['posts.urls', 'users.urls', 'about.urls']
+
+
+def named_routes():
+    """Пары (имя маршрута, имена параметров) из проверяемых urlconf."""
+    for module_name in URLCONFS:
+        module = import_module(module_name)
+        for pattern in module.urlpatterns:
+            if isinstance(pattern, URLPattern) and pattern.name:
+                yield (
+                    f'{module.app_name}:{pattern.name}',
+                    sorted(pattern.pattern.converters),
+                )
+
+
+class QueryBudgetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(
+            author=cls.author, text='Пост', group=cls.group
+        )
+
+    def grow(self, size):
+        """Добавляет по `size` постов, комментариев и подписчиков."""
+        for number in range(size):
+            user = User.objects.create_user(username=f'user{number}')
+            Follow.objects.create(user=user, author=self.author)
+            Post.objects.create(
+                author=self.author, text=f'Пост {number}', group=self.group
+            )
+            Comment.objects.create(
+                post=self.post, author=user, text=f'Комментарий {number}'
+            )
+
+    def route_kwargs(self, params):
+        values = {
+            'slug': self.group.slug,
+            'username': self.author.username,
+            'post_id': self.post.pk,
+        }
+        missing = set(params) - set(values)
+        self.assertFalse(
+            missing, f'Нет значений для параметров маршрута: {missing}'
+        )
+        return {param: values[param] for param in params}
+
+    def measure(self):
+        counts = {}
+        for name, params in named_routes():
+            url = reverse(name, kwargs=self.route_kwargs(params))
+            for role in ('anonymous', 'authenticated'):
+                client = Client()
+                if role == 'authenticated':
+                    client.force_login(self.reader)
+                # Меряется сборка страницы, а не чтение из кеша.
+                cache.clear()
+                # Подписка и отписка меняют данные, откатываем их,
+                # чтобы каждый визит видел одно и то же состояние.
+                with transaction.atomic():
+                    with CaptureQueriesContext(connection) as queries:
+                        client.get(url)
+                    transaction.set_rollback(True)
+                counts.setdefault(name, {})[role] = len(queries)
+        return counts
+
+    def test_query_counts_are_constant_and_within_budget(self):
+        small = self.measure()
+        self.grow(settings.ARTICLES_SELECTION * 2)
+        large = self.measure()
+        if os.environ.get('QUERY_BUDGET_RECORD'):
+            with open(BUDGETS_PATH, 'w', encoding='utf-8') as budgets_file:
+                json.dump(large, budgets_file, indent=2, sort_keys=True)
+                budgets_file.write('\n')
+        with open(BUDGETS_PATH, encoding='utf-8') as budgets_file:
+            budgets = json.load(budgets_file)
+        for name, roles in large.items():
+            for role, count in roles.items():
+                with self.subTest(route=name, role=role):
+                    self.assertEqual(
+                        count, small[name][role],
+                        'Число запросов растёт вместе с данными',
+                    )
+                    self.assertIn(
+                        role, budgets.get(name, {}),
+                        'Маршрута нет в query_budgets.json',
+                    )
+                    self.assertLessEqual(count, budgets[name][role])
@@ -0,0 +1,54 @@
+import hashlib
+import os
+import tempfile
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from core.storage import ContentAddressedStorage
+
+
+class ContentAddressedStorageTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.storage = ContentAddressedStorage(location=self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_name_is_content_hash(self):
+        digest = hashlib.sha256(b'content').hexdigest()
+        name = self.storage.save('posts/Image.GIF', ContentFile(b'content'))
+        self.assertEqual(name, f'posts/{digest[:2]}/{digest}.gif')
+        with self.storage.open(name) as stored:
+            self.assertEqual(stored.read(), b'content')
+
+    def test_same_content_is_stored_once(self):
+        """Одинаковые загрузки под разными именами дают один файл."""
+        first = self.storage.save('posts/image.gif', ContentFile(b'same'))
+        second = self.storage.save('posts/copy.gif', ContentFile(b'same'))
+        other = self.storage.save('posts/image.gif', ContentFile(b'other'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        files = [
+            name
+            for _, _, names in os.walk(self.directory.name)
+            for name in names
+        ]
+        self.assertEqual(len(files), 2)
+
+    def test_delete_stale_keeps_reuploaded_file(self):
+        name = self.storage.save('posts/image.gif', ContentFile(b'data'))
+        old = (timezone.now() - timedelta(days=2)).timestamp()
+        os.utime(self.storage.path(name), (old, old))
+        cutoff = timezone.now() - timedelta(days=1)
+        # Повторная загрузка того же содержимого освежает файл.
+        self.storage.save('posts/again.gif', ContentFile(b'data'))
+        self.assertIsNone(self.storage.delete_stale(name, cutoff))
+        self.assertTrue(self.storage.exists(name))
+        os.utime(self.storage.path(name), (old, old))
+        self.assertEqual(self.storage.delete_stale(name, cutoff), 4)
+        self.assertFalse(self.storage.exists(name))
+        self.assertIsNone(self.storage.delete_stale(name, cutoff))
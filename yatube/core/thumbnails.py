@@ -0,0 +1,125 @@
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix, del_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core import timing
+
+
+class KVStore(cached_db_kvstore.KVStore):
+    """Хранилище ключей sorl, которое читает много миниатюр разом.
+
+    Кроме того, умеет обходить исходники по порядку ключей и удалять
+    записи исходника вместе с записями его миниатюр: этим пользуется
+    сборщик мусора в медиафайлах.
+    """
+
+    def get_many(self, image_files):
+        """Найденные ImageFile или None в порядке `image_files`.
+
+        Ключи читаются одним get_many из кеша, промахи — одним запросом
+        к базе. Отсутствие записи кешируется так же, как в `_get_raw`.
+        """
+        keys = [add_prefix(image_file.key) for image_file in image_files]
+        values = self.cache.get_many(keys)
+        missing = set(keys) - set(values)
+        if missing:
+            stored = dict(KVStoreModel.objects.filter(
+                key__in=missing
+            ).values_list('key', 'value'))
+            fetched = {
+                key: stored.get(key, cached_db_kvstore.EMPTY_VALUE)
+                for key in missing
+            }
+            self.cache.set_many(fetched, settings.THUMBNAIL_CACHE_TIMEOUT)
+            values.update(fetched)
+        return [
+            None if values[key] == cached_db_kvstore.EMPTY_VALUE
+            else deserialize_image_file(values[key])
+            for key in keys
+        ]
+
+    def source_keys(self, after='', limit=100):
+        """Ключи исходников с миниатюрами, идущие по порядку после `after`."""
+        prefix = add_prefix('', 'thumbnails')
+        keys = KVStoreModel.objects.filter(
+            key__startswith=prefix, key__gt=prefix + after
+        ).order_by('key').values_list('key', flat=True)[:limit]
+        return [del_prefix(key) for key in keys]
+
+    def source(self, key):
+        """ImageFile исходника по ключу или None, если записи нет."""
+        return self._get(key)
+
+    def source_thumbnails(self, key):
+        """ImageFile всех известных миниатюр исходника `key`."""
+        thumbnail_keys = self._get(key, identity='thumbnails') or []
+        return [
+            thumbnail
+            for thumbnail in map(self._get, thumbnail_keys)
+            if thumbnail is not None
+        ]
+
+    def drop_source(self, key):
+        """Удаляет записи исходника `key` и всех его миниатюр.
+
+        Файлы не трогает: возвращает ImageFile миниатюр, чтобы их
+        удалил вызывающий код.
+        """
+        thumbnail_keys = self._get(key, identity='thumbnails') or []
+        thumbnails = self.source_thumbnails(key)
+        self._delete_raw(
+            add_prefix(key),
+            add_prefix(key, 'thumbnails'),
+            *map(add_prefix, thumbnail_keys),
+        )
+        return thumbnails
+
+
+class TimedThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl-thumbnail, отдающий время миниатюр в Server-Timing.
+
+    Кроме обычного `get_thumbnail` умеет отдавать только уже готовые
+    миниатюры, не создавая их на потоке запроса.
+    """
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        with timing.timed('thumbnail'):
+            return super().get_thumbnail(file_, geometry_string, **options)
+
+    def get_ready_thumbnails(self, requests):
+        """Готовые миниатюры для списка (файл, геометрия, опции).
+
+        Все миниатюры читаются из хранилища ключей одним обращением;
+        на месте ещё не созданных стоит None.
+        """
+        with timing.timed('thumbnail'):
+            return default.kvstore.get_many([
+                self._thumbnail_file(file_, geometry_string, dict(options))
+                for file_, geometry_string, options in requests
+            ])
+
+    def _thumbnail_file(self, file_, geometry_string, options):
+        # Имя файла считается так же, как в ThumbnailBackend.get_thumbnail.
+        source = ImageFile(file_)
+        if settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def _create_thumbnail(self, source_image, geometry_string, options,
+                          thumbnail):
+        timing.add('thumbnail_created')
+        super()._create_thumbnail(
+            source_image, geometry_string, options, thumbnail
+        )
@@ -0,0 +1,78 @@
+"""Сбор времени и счётчиков одного запроса для заголовка Server-Timing.
+
+Пока идёт `collect()`, инструментированные места (БД, шаблоны, кеш,
+миниатюры) добавляют свои замеры в текущий поток. Вне `collect()`
+замеры ничего не стоят, кроме одной проверки.
+"""
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.template.backends.django import Template
+
+_local = threading.local()
+
+
+class Timings:
+    def __init__(self):
+        self.durations = defaultdict(float)
+        self.counts = Counter()
+
+
+def current():
+    return getattr(_local, 'timings', None)
+
+
+@contextmanager
+def collect():
+    """Собирает замеры кода внутри блока в объект `Timings`."""
+    timings = Timings()
+    _local.timings = timings
+    try:
+        yield timings
+    finally:
+        _local.timings = None
+
+
+def add(name, seconds=0.0, count=1):
+    timings = current()
+    if timings is not None:
+        timings.durations[name] += seconds
+        timings.counts[name] += count
+
+
+@contextmanager
+def timed(name):
+    if current() is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add(name, time.perf_counter() - started)
+
+
+def database_wrapper(execute, sql, params, many, context):
+    """Обёртка для `connection.execute_wrapper`, считающая запросы."""
+    with timed('db'):
+        return execute(sql, params, many, context)
+
+
+def instrument_templates():
+    """Засекает рендеринг шаблонов; вложенные не считаются дважды."""
+    render = Template.render
+
+    def timed_render(self, *args, **kwargs):
+        timings = current()
+        if timings is None or getattr(_local, 'rendering', False):
+            return render(self, *args, **kwargs)
+        _local.rendering = True
+        try:
+            with timed('template'):
+                return render(self, *args, **kwargs)
+        finally:
+            _local.rendering = False
+
+    Template.render = timed_render
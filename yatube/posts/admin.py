@@ -1,9 +1,20 @@
 from django.contrib import admin
 
+from . import search
 from .models import Comment, Follow, Group, Post
+from .paginators import EstimatedCountPaginator
 
 
-class PostAdmin(admin.ModelAdmin):
+class FastChangeListMixin:
+    """Список без точного COUNT(*) на больших таблицах.
+
+    Второй COUNT(*) по всей таблице для «Показать все» тоже не нужен.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class PostAdmin(FastChangeListMixin, admin.ModelAdmin):
     list_display = (
         'pk',
         'text',
@@ -12,12 +23,45 @@ class PostAdmin(admin.ModelAdmin):
         'group',
     )
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    raw_id_fields = ('author',)
     search_fields = ('text',)
-    list_filter = ('pub_date',)
+    # Иерархия дат фильтрует диапазоном pub_date >= ... AND pub_date < ...,
+    # который идёт по индексу (-pub_date, -id).
+    date_hierarchy = 'pub_date'
     empty_value_display = '-пусто-'
 
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        field = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name == 'group':
+            # Формы строк списка копируют поле, а готовый список выбора
+            # копируется без запросов: группы выбираются один раз на
+            # страницу, а не для каждой строки.
+            if not hasattr(request, '_group_choices'):
+                request._group_choices = list(iter(field.choices))
+            field.choices = request._group_choices
+        return field
+
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск идёт по индексу FTS5 вместо LIKE '%...%' по всем постам.
+        if not search_term:
+            return queryset, False
+        return search.matching(queryset, search_term), False
+
+
+class CommentAdmin(FastChangeListMixin, admin.ModelAdmin):
+    list_display = ('pk', 'text', 'created', 'author', 'post')
+    list_select_related = ('author', 'post')
+    raw_id_fields = ('author', 'post')
+
+
+class FollowAdmin(FastChangeListMixin, admin.ModelAdmin):
+    list_display = ('pk', 'user', 'author')
+    list_select_related = ('user', 'author')
+    raw_id_fields = ('user', 'author')
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
-admin.site.register(Comment)
-admin.site.register(Follow)
+admin.site.register(Comment, CommentAdmin)
+admin.site.register(Follow, FollowAdmin)
@@ -0,0 +1,60 @@
+"""Общие части массовой загрузки и обхода больших таблиц порциями."""
+import itertools
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+
+from posts import timeline
+
+
+def batched(iterable, size):
+    """Списки по `size` элементов `iterable`, последний может быть короче."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def pk_chunks(queryset, size):
+    """Первичные ключи выборки порциями, по диапазонам без OFFSET."""
+    last = None
+    while True:
+        chunk = queryset.order_by('pk')
+        if last is not None:
+            chunk = chunk.filter(pk__gt=last)
+        ids = list(chunk.values_list('pk', flat=True)[:size])
+        if not ids:
+            return
+        yield ids
+        last = ids[-1]
+
+
+@contextmanager
+def own_dates(model, field_name):
+    """Позволяет bulk_create записать свою дату в поле с auto_now_add."""
+    field = model._meta.get_field(field_name)
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def finish_load(user_ids, batch_size, stdout):
+    """Пересобирает то, что сигналы не обновили при массовой загрузке.
+
+    Ленты подписок пользователей `user_ids` пересобираются порциями по
+    `batch_size`, счётчики сверяются командой `reconcile_counters`.
+    """
+    stdout.write('Пересчёт лент подписок и счётчиков...')
+    timeline.mark_popular_authors()
+    for chunk in batched(user_ids, batch_size):
+        with transaction.atomic():
+            timeline.rebuild(chunk[0], chunk[-1])
+    call_command('reconcile_counters', chunk_size=batch_size, stdout=stdout)
+    # Данные записаны в обход сигналов, кеши о них не знают.
+    cache.clear()
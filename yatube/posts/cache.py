@@ -0,0 +1,177 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from core.cache import get_or_rebuild
+from core.holes import fill_holes
+from posts.models import Group, Post, User
+
+
+def index_namespace():
+    return 'index'
+
+
+def group_namespace(slug):
+    return f'group:{slug}'
+
+
+def author_namespace(username):
+    return f'author:{username}'
+
+
+def post_namespace(post_id):
+    return f'post:{post_id}'
+
+
+def author_name_namespace(user_id):
+    """Страницы отдельных постов, где выводится имя пользователя: его
+    собственных постов и постов с его комментариями."""
+    return f'author-name:{user_id}'
+
+
+def group_page_namespace(group_id):
+    """Страницы отдельных постов группы, где выводится её название."""
+    return f'group-page:{group_id}'
+
+
+def _post_page_key(post_id):
+    return f'post-page:{post_id}'
+
+
+def post_page_namespaces(post_id):
+    """Пространства страницы поста: сам пост, его группа, автор и
+    авторы комментариев.
+
+    Id автора, группы и комментаторов хранятся в кеше без срока,
+    поэтому для готовой страницы в базу ходить не нужно. При
+    сохранении поста или комментария ключ сбрасывается.
+    """
+    key = _post_page_key(post_id)
+    ids = cache.get(key)
+    if ids is None:
+        # Строка на комментарий; повторы убираются здесь, а не DISTINCT.
+        rows = list(
+            Post.objects.filter(pk=post_id).order_by().values_list(
+                'author_id', 'group_id', 'comments__author_id'
+            )
+        )
+        if not rows:
+            return [post_namespace(post_id)]
+        author_id, group_id, _ = rows[0]
+        commenters = {row[2] for row in rows} - {None, author_id}
+        ids = author_id, group_id, sorted(commenters)
+        cache.set(key, ids, None)
+    author_id, group_id, commenters = ids
+    namespaces = [post_namespace(post_id)]
+    if group_id is not None:
+        namespaces.append(group_page_namespace(group_id))
+    namespaces.extend(
+        author_name_namespace(user_id) for user_id in [author_id, *commenters]
+    )
+    return namespaces
+
+
+def forget_post_page(post_id):
+    cache.delete(_post_page_key(post_id))
+
+
+def post_namespaces(post):
+    """Пространства страниц, на которых выводится пост."""
+    group_ids = {post.group_id, getattr(post, '_previous_group_id', None)}
+    slugs = Group.objects.filter(pk__in=group_ids - {None}).values_list(
+        'slug', flat=True
+    )
+    author_ids = {post.author_id, getattr(post, '_previous_author_id', None)}
+    usernames = User.objects.filter(pk__in=author_ids - {None}).values_list(
+        'username', flat=True
+    )
+    return [
+        index_namespace(),
+        post_namespace(post.pk),
+        *(author_namespace(username) for username in usernames),
+        *(group_namespace(slug) for slug in slugs),
+    ]
+
+
+def _version_key(namespace):
+    # Слаги и имена пользователей бывают кириллическими и с пробелами.
+    digest = hashlib.md5(namespace.encode()).hexdigest()
+    return f'feed-version:{digest}'
+
+
+def _initial_version():
+    # Версия, созданная заново после вытеснения ключа, не должна
+    # совпасть со старой, поэтому начинаем с текущего времени.
+    return time.time_ns()
+
+
+def namespace_version(namespaces):
+    """Собирает общую версию страницы из версий её пространств имён."""
+    keys = [_version_key(namespace) for namespace in namespaces]
+    versions = cache.get_many(keys)
+    missing = {key: _initial_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return '.'.join(str(versions[key]) for key in keys)
+
+
+def bump(namespaces):
+    """Делает устаревшими все страницы указанных пространств имён."""
+    for namespace in set(namespaces):
+        try:
+            cache.incr(_version_key(namespace))
+        except ValueError:
+            cache.set(_version_key(namespace), _initial_version(), None)
+
+
+def cache_feed(namespaces):
+    """Кеширует страницу под версиями пространств имён `namespaces`.
+
+    `namespaces` вызывается с аргументами представления и возвращает
+    список пространств, от которых зависит страница. Страница живёт
+    `FEED_CACHE_TIMEOUT` секунд, но устаревает сразу, как только
+    сигналы поднимут версию любого из её пространств. Пересобирает
+    устаревшую страницу один запрос, остальные пока получают прежнюю.
+
+    В кеше лежит одна страница на всех: части, зависящие от
+    пользователя, выводятся тегом `{% hole %}` и дорисовываются при
+    каждом запросе.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            version = namespace_version(namespaces(*args, **kwargs))
+            path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            key = f'feed-page:{path}'
+            rendered = []
+
+            def render():
+                request.punch_holes = True
+                try:
+                    response = view(request, *args, **kwargs)
+                finally:
+                    request.punch_holes = False
+                rendered.append(response)
+                if response.status_code != 200 or response.streaming:
+                    return None
+                return response.content, response['Content-Type']
+
+            cached = get_or_rebuild(
+                key, render, settings.FEED_CACHE_TIMEOUT, version=version
+            )
+            if rendered:
+                response = rendered[0]
+            else:
+                response = HttpResponse(cached[0], content_type=cached[1])
+            if response.status_code == 200 and not response.streaming:
+                response.content = fill_holes(request, response.content)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,62 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from posts import thumbnails
+
+
+def card_version(post):
+    """Отпечаток всего, что выводится в карточке поста.
+
+    Правка текста или картинки, смена группы или имени автора дают
+    новую версию, и старая карточка просто перестаёт читаться.
+    """
+    author = post.author
+    group = post.group
+    fields = [
+        post.text,
+        post.pub_date.isoformat(),
+        post.image.name or '',
+        group.slug if group else '',
+        author.username,
+        author.get_full_name(),
+    ]
+    return hashlib.md5('\x1f'.join(fields).encode()).hexdigest()
+
+
+def card_key(post, template_name, options):
+    variant = hashlib.md5(
+        repr((template_name, sorted(options.items()))).encode()
+    ).hexdigest()
+    return f'post-card:{post.pk}:{variant}:{card_version(post)}'
+
+
+def render_cards(posts, template_name, **options):
+    """Список карточек постов; готовые берутся из кеша одним get_many.
+
+    Карточка не зависит от пользователя и запроса, поэтому её разметка
+    общая для всех лент, выводящих пост шаблоном `template_name`.
+    Миниатюры для карточек, которых нет в кеше, ищутся разом.
+    """
+    keys = [(card_key(post, template_name, options), post) for post in posts]
+    cached = cache.get_many([key for key, _ in keys])
+    thumbnails.prefetch([post for key, post in keys if key not in cached])
+    rendered = {}
+    cards = []
+    for key, post in keys:
+        card = cached.get(key)
+        if card is None:
+            pending = []
+            card = render_to_string(template_name, {
+                'post': post, 'pending_thumbnails': pending, **options,
+            })
+            # Карточку с оригиналом вместо миниатюры не запоминаем.
+            if not pending:
+                rendered[key] = card
+        cards.append(mark_safe(card))
+    if rendered:
+        cache.set_many(rendered, settings.POST_CARD_CACHE_TIMEOUT)
+    return cards
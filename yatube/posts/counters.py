@@ -0,0 +1,135 @@
+from django.db.models import Count, F
+from django.utils import timezone
+
+from posts.models import AuthorCounters, Comment, Follow, Post, StoredImage
+
+
+def author_counters(user):
+    """Счётчики пользователя; для нового пользователя — нулевые."""
+    try:
+        return user.counters
+    except AuthorCounters.DoesNotExist:
+        return AuthorCounters(user=user)
+
+
+def change_author_counters(user_id, **deltas):
+    """Атомарно сдвигает счётчики пользователя на `deltas`.
+
+    Строка счётчиков заводится при первом увеличении. Уменьшение
+    несуществующей строки пропускается: так бывает при каскадном
+    удалении самого пользователя.
+    """
+    updates = {field: F(field) + delta for field, delta in deltas.items()}
+    counters = AuthorCounters.objects.filter(user_id=user_id)
+    if counters.update(**updates) or min(deltas.values()) < 0:
+        return
+    AuthorCounters.objects.get_or_create(user_id=user_id)
+    counters.update(**updates)
+
+
+def change_comment_count(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comment_count=F('comment_count') + delta
+    )
+
+
+def change_image_refs(name, delta):
+    """Атомарно сдвигает число постов, ссылающихся на файл `name`.
+
+    Строка заводится при первой ссылке; когда ссылок не остаётся, в
+    `released` записывается время, с которого файл никому не нужен.
+    """
+    images = StoredImage.objects.filter(name=name)
+    if delta > 0:
+        if not images.update(refs=F('refs') + delta, released=None):
+            StoredImage.objects.get_or_create(name=name)
+            images.update(refs=F('refs') + delta, released=None)
+        return
+    images.update(refs=F('refs') + delta)
+    images.filter(refs__lte=0, released__isnull=True).update(
+        released=timezone.now()
+    )
+
+
+def _count_by(queryset, field, ids):
+    return dict(
+        queryset.filter(**{f'{field}__in': ids})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values_list(field, 'total')
+    )
+
+
+def reconcile_authors(user_ids):
+    """Пересчитывает счётчики пользователей `user_ids`.
+
+    Возвращает число исправленных строк.
+    """
+    posts = _count_by(Post.objects, 'author_id', user_ids)
+    followers = _count_by(Follow.objects, 'author_id', user_ids)
+    following = _count_by(Follow.objects, 'user_id', user_ids)
+    existing = AuthorCounters.objects.in_bulk(user_ids)
+    changed = []
+    created = []
+    for user_id in user_ids:
+        actual = AuthorCounters(
+            user_id=user_id,
+            posts=posts.get(user_id, 0),
+            followers=followers.get(user_id, 0),
+            following=following.get(user_id, 0),
+        )
+        stored = existing.get(user_id)
+        if stored is None:
+            created.append(actual)
+        elif (stored.posts, stored.followers, stored.following) != (
+            actual.posts, actual.followers, actual.following
+        ):
+            changed.append(actual)
+    AuthorCounters.objects.bulk_create(created, ignore_conflicts=True)
+    AuthorCounters.objects.bulk_update(
+        changed, ['posts', 'followers', 'following']
+    )
+    return len(created) + len(changed)
+
+
+def reconcile_comments(post_ids):
+    """Пересчитывает `comment_count` постов `post_ids`.
+
+    Возвращает число исправленных постов.
+    """
+    comments = _count_by(Comment.objects, 'post_id', post_ids)
+    changed = [
+        Post(pk=post_id, comment_count=comments.get(post_id, 0))
+        for post_id, stored in Post.objects.filter(
+            pk__in=post_ids
+        ).values_list('pk', 'comment_count')
+        if stored != comments.get(post_id, 0)
+    ]
+    Post.objects.bulk_update(changed, ['comment_count'])
+    return len(changed)
+
+
+def reconcile_images(names):
+    """Пересчитывает ссылки постов на файлы картинок `names`.
+
+    Возвращает число исправленных строк.
+    """
+    refs = _count_by(Post.objects, 'image', names)
+    existing = StoredImage.objects.in_bulk(names)
+    now = timezone.now()
+    created = []
+    changed = []
+    for name in names:
+        total = refs.get(name, 0)
+        stored = existing.get(name)
+        if stored is None:
+            if total:
+                created.append(StoredImage(name=name, refs=total))
+        elif stored.refs != total:
+            stored.refs = total
+            stored.released = (stored.released or now) if not total else None
+            changed.append(stored)
+    StoredImage.objects.bulk_create(created, ignore_conflicts=True)
+    StoredImage.objects.bulk_update(changed, ['refs', 'released'])
+    return len(created) + len(changed)
@@ -0,0 +1,94 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def index_count_key():
+    return 'posts'
+
+
+def group_count_key(group_id):
+    return f'posts:group:{group_id}'
+
+
+def post_count_keys(post, group_id=None):
+    """Ключи всех счётчиков, в которые входит пост."""
+    keys = [index_count_key()]
+    group_id = post.group_id if group_id is None else group_id
+    if group_id:
+        keys.append(group_count_key(group_id))
+    return keys
+
+
+def _value_key(key):
+    return f'count:{key}'
+
+
+def _fresh_key(key):
+    return f'count:{key}:fresh'
+
+
+def _lock_key(key):
+    return f'count:{key}:lock'
+
+
+def _store(key, value):
+    cache.set(_value_key(key), value, settings.COUNT_ESTIMATE_TIMEOUT)
+    cache.set(_fresh_key(key), True, settings.COUNT_ESTIMATE_REFRESH)
+
+
+def _refresh(key, queryset):
+    try:
+        _store(key, queryset.count())
+    except Exception:
+        logger.exception('Не удалось пересчитать счётчик %s', key)
+    finally:
+        cache.delete(_lock_key(key))
+        # У потока-воркера своё соединение с БД, его нужно закрыть.
+        connection.close()
+
+
+def _schedule_refresh(key, queryset):
+    global _executor
+    lock_timeout = settings.COUNT_ESTIMATE_REFRESH
+    if not cache.add(_lock_key(key), True, lock_timeout):
+        return
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='count-refresh'
+        )
+    _executor.submit(_refresh, key, queryset.all())
+
+
+def estimated_count(key, queryset):
+    """Возвращает приблизительное число записей без COUNT(*) в запросе.
+
+    Значение хранится в кеше и поправляется сигналами при создании и
+    удалении постов. Когда оно устаревает, пересчёт уходит в фоновый
+    поток, а запрос получает прежнюю оценку. Считать синхронно
+    приходится только при холодном кеше.
+    """
+    values = cache.get_many([_value_key(key), _fresh_key(key)])
+    value = values.get(_value_key(key))
+    if value is None:
+        value = queryset.count()
+        _store(key, value)
+    elif _fresh_key(key) not in values:
+        _schedule_refresh(key, queryset)
+    return value
+
+
+def adjust_counts(keys, delta):
+    """Сдвигает закешированные оценки; отсутствующие ключи пропускает."""
+    for key in keys:
+        try:
+            cache.incr(_value_key(key), delta)
+        except ValueError:
+            pass
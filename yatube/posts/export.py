@@ -0,0 +1,114 @@
+"""Выгрузка данных пользователя zip-архивом, который собирается на лету.
+
+Архив не держится в памяти целиком: zipfile пишет в буфер без `seek`,
+а генератор отдаёт накопленные байты после каждой записи. Посты и
+комментарии читаются из базы через `.iterator()`, картинки — кусками
+по `CHUNK_SIZE`, поэтому память не зависит от размера аккаунта.
+
+Записи лежат в JSONL того же вида, что принимает `import_content`.
+"""
+import json
+import os
+import time
+import zipfile
+
+from posts.models import Comment, Post
+
+CHUNK_SIZE = 64 * 1024
+# Сколько строк выбирается из базы за один раз.
+ITERATOR_CHUNK_SIZE = 500
+
+
+class _Buffer:
+    """Файл только для записи, содержимое которого забирается кусками."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _post_records(user):
+    posts = Post.objects.filter(author=user).order_by('pk').values(
+        'pk', 'text', 'pub_date', 'image', 'group__slug'
+    )
+    for post in posts.iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+        yield {
+            'type': 'post',
+            'id': post['pk'],
+            'author': user.username,
+            'group': post['group__slug'],
+            'text': post['text'],
+            'pub_date': post['pub_date'].isoformat(),
+            'image': post['image'] or None,
+        }
+
+
+def _comment_records(user):
+    comments = Comment.objects.filter(author=user).order_by('pk').values(
+        'post_id', 'text', 'created'
+    )
+    for comment in comments.iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+        yield {
+            'type': 'comment',
+            'post': comment['post_id'],
+            'author': user.username,
+            'text': comment['text'],
+            'created': comment['created'].isoformat(),
+        }
+
+
+def _image_names(user):
+    # DISTINCT считает база: одна картинка может быть у нескольких постов.
+    names = Post.objects.filter(author=user).exclude(image='').order_by(
+        'image'
+    ).values_list('image', flat=True).distinct()
+    return names.iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+
+
+def _archive(user):
+    buffer = _Buffer()
+    storage = Post._meta.get_field('image').storage
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, records in (
+            ('posts.jsonl', _post_records(user)),
+            ('comments.jsonl', _comment_records(user)),
+        ):
+            with archive.open(name, 'w', force_zip64=True) as entry:
+                for record in records:
+                    entry.write(
+                        json.dumps(record, ensure_ascii=False).encode()
+                        + b'\n'
+                    )
+                    yield buffer.take()
+        for name in _image_names(user):
+            try:
+                source = storage.open(name)
+            except FileNotFoundError:
+                continue
+            # Картинки уже сжаты, сжимать их ещё раз незачем.
+            info = zipfile.ZipInfo(
+                os.path.join('images', name), time.localtime()[:6]
+            )
+            info.compress_type = zipfile.ZIP_STORED
+            with source, archive.open(info, 'w', force_zip64=True) as entry:
+                for chunk in source.chunks(CHUNK_SIZE):
+                    entry.write(chunk)
+                    yield buffer.take()
+    yield buffer.take()
+
+
+def stream(user):
+    """Байты zip-архива с постами, комментариями и картинками `user`."""
+    # Пока deflate копит данные, буфер бывает пуст; пустые куски не нужны.
+    return (chunk for chunk in _archive(user) if chunk)
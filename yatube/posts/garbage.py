@@ -0,0 +1,160 @@
+"""Сборка мусора в медиафайлах: ненужные картинки постов и миниатюры."""
+import os
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from posts.bulk import batched
+from posts.models import Post, StoredImage
+
+# Каталог, в который загружаются картинки постов.
+UPLOAD_DIRECTORY = Post._meta.get_field('image').upload_to
+
+
+def _walk(storage, directory):
+    """Имена всех файлов каталога хранилища, по одному каталогу за раз."""
+    try:
+        directories, files = storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for name in sorted(files):
+        yield os.path.join(directory, name)
+    for name in sorted(directories):
+        yield from _walk(storage, os.path.join(directory, name))
+
+
+class Collector:
+    """Удаляет медиафайлы, на которые ничто не ссылается.
+
+    Работает порциями по `batch_size`: каждая порция проверяется
+    несколькими короткими запросами, поэтому база не блокируется надолго.
+    Файлы моложе `grace` не трогаются: их может как раз сохранять
+    другой запрос. При `dry_run` только считает, что было бы удалено.
+    """
+
+    def __init__(self, grace, batch_size, dry_run=False):
+        self.cutoff = timezone.now() - grace
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.storage = Post._meta.get_field('image').storage
+        self.originals = 0
+        self.thumbnails = 0
+        self.bytes = 0
+
+    def collect(self):
+        self.released_images()
+        self.untracked_originals()
+        self.orphaned_sources()
+        self.untracked_thumbnails()
+
+    def _delete(self, storage, name):
+        try:
+            size = storage.size(name)
+        except FileNotFoundError:
+            return False
+        if not self.dry_run:
+            storage.delete(name)
+        self.bytes += size
+        return True
+
+    def _is_old(self, storage, name):
+        try:
+            return storage.get_modified_time(name) <= self.cutoff
+        except FileNotFoundError:
+            return False
+
+    def _drop_source(self, key):
+        if self.dry_run:
+            thumbnails = default.kvstore.source_thumbnails(key)
+        else:
+            thumbnails = default.kvstore.drop_source(key)
+        for thumbnail in thumbnails:
+            self.thumbnails += self._delete(thumbnail.storage, thumbnail.name)
+
+    def _drop_original(self, name):
+        if self.dry_run:
+            dropped = self._delete(self.storage, name)
+        else:
+            # Файл могли загрузить заново, пока шла сборка: тогда он
+            # свежий, и хранилище его не тронет.
+            size = self.storage.delete_stale(name, self.cutoff)
+            dropped = size is not None
+            self.bytes += size or 0
+        if dropped:
+            self.originals += 1
+            self._drop_source(ImageFile(name, self.storage).key)
+
+    def released_images(self):
+        """Картинки, на которые дольше `grace` не ссылается ни один пост."""
+        released = StoredImage.objects.filter(
+            refs__lte=0, released__lte=self.cutoff
+        ).order_by('name').values_list('name', flat=True)
+        last = ''
+        while True:
+            names = list(released.filter(name__gt=last)[:self.batch_size])
+            if not names:
+                return
+            last = names[-1]
+            if not self.dry_run:
+                with transaction.atomic():
+                    # Пока шла выборка, картинку могли загрузить снова.
+                    names = list(released.filter(name__in=names))
+                    StoredImage.objects.filter(name__in=names).delete()
+            for name in names:
+                self._drop_original(name)
+
+    def untracked_originals(self):
+        """Загрузки, о которых не знает ни один пост и ни одна запись.
+
+        Например, копии с суффиксами из времён хранилища по умолчанию.
+        """
+        files = _walk(self.storage, UPLOAD_DIRECTORY.rstrip('/'))
+        for names in batched(files, self.batch_size):
+            known = set(
+                Post.objects.filter(image__in=names).order_by()
+                .values_list('image', flat=True)
+            )
+            known.update(
+                StoredImage.objects.filter(name__in=names)
+                .values_list('name', flat=True)
+            )
+            for name in names:
+                if name not in known and self._is_old(self.storage, name):
+                    self._drop_original(name)
+
+    def orphaned_sources(self):
+        """Миниатюры в хранилище ключей, исходника которых больше нет."""
+        last = ''
+        while True:
+            keys = default.kvstore.source_keys(last, self.batch_size)
+            if not keys:
+                return
+            last = keys[-1]
+            for key in keys:
+                source = default.kvstore.source(key)
+                if source is None or not source.exists():
+                    self._drop_source(key)
+
+    def untracked_thumbnails(self):
+        """Файлы миниатюр, о которых не знает хранилище ключей."""
+        storage = default.storage
+        directory = thumbnail_settings.THUMBNAIL_PREFIX.rstrip('/')
+        files = _walk(storage, directory)
+        for names in batched(files, self.batch_size):
+            found = default.kvstore.get_many(
+                [ImageFile(name, storage) for name in names]
+            )
+            for name, thumbnail in zip(names, found):
+                if thumbnail is None and self._is_old(storage, name):
+                    self.thumbnails += self._delete(storage, name)
+
+
+def collect(grace=timedelta(days=1), batch_size=200, dry_run=False):
+    """Собирает мусор и возвращает отработавший `Collector` со счётом."""
+    collector = Collector(grace, batch_size, dry_run)
+    collector.collect()
+    return collector
@@ -0,0 +1,235 @@
+import json
+import statistics
+import subprocess
+import time
+import tracemalloc
+from contextlib import contextmanager
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.template.backends.django import Template
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import AuthorCounters, Follow, Group, Post, User
+
+METRICS = (
+    'p50_ms', 'p95_ms', 'p99_ms', 'queries', 'sql_ms', 'template_ms',
+    'peak_kb',
+)
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(int(len(values) * share), len(values) - 1)]
+
+
+@contextmanager
+def sql_timer():
+    """Считает запросы к БД и время их выполнения."""
+    stats = {'queries': 0, 'seconds': 0.0}
+
+    def timed_execute(execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            stats['queries'] += 1
+            stats['seconds'] += time.perf_counter() - started
+
+    with connection.execute_wrapper(timed_execute):
+        yield stats
+
+
+@contextmanager
+def template_timer():
+    """Считает время рендеринга шаблонов верхнего уровня.
+
+    Вложенные render_to_string (карточки, дырки) входят во время
+    внешнего шаблона и отдельно не учитываются.
+    """
+    spent = [0.0]
+    depth = [0]
+    render = Template.render
+
+    def timed_render(self, *args, **kwargs):
+        depth[0] += 1
+        started = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            depth[0] -= 1
+            if not depth[0]:
+                spent[0] += time.perf_counter() - started
+
+    with mock.patch.object(Template, 'render', timed_render):
+        yield spent
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержку, запросы, время SQL и шаблонов и пиковую '
+        'память основных лент на текущей базе. Результат сохраняется в '
+        'JSON и сравнивается с сохранённым ранее.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--cold', action='store_true',
+                            help='Очищать кеш перед каждым запросом.')
+        parser.add_argument('--output', help='Куда сохранить результат.')
+        parser.add_argument(
+            '--compare', nargs='+', metavar='BASELINE',
+            help='Сравнить с сохранённым результатом; с двумя файлами '
+                 'сравнить их между собой без замера.',
+        )
+
+    def handle(self, *args, **options):
+        compare = options['compare'] or []
+        if len(compare) > 2:
+            raise CommandError('--compare принимает один или два файла.')
+        if len(compare) == 2:
+            self.compare(self.load(compare[0]), self.load(compare[1]))
+            return
+        result = self.run(options)
+        self.report(result)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(result, output, indent=2, ensure_ascii=False)
+                output.write('\n')
+        if compare:
+            self.compare(self.load(compare[0]), result)
+
+    def load(self, path):
+        try:
+            with open(path, encoding='utf-8') as baseline:
+                return json.load(baseline)
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Не удалось прочитать {path}: {error}')
+
+    def targets(self):
+        """URL лент на самых нагруженных объектах текущей базы."""
+        post = Post.objects.order_by('-comment_count').first()
+        group = Group.objects.annotate(
+            post_total=Count('posts')
+        ).order_by('-post_total').first()
+        author = AuthorCounters.objects.order_by('-posts').first()
+        reader = AuthorCounters.objects.order_by('-following').first()
+        if not (post and group and author and reader):
+            raise CommandError(
+                'В базе нет данных, заполните её командой seed_scale.'
+            )
+        reader = User.objects.get(pk=reader.user_id)
+        author = User.objects.get(pk=author.user_id)
+        return reader, {
+            'index': reverse('posts:index'),
+            'group_posts': reverse(
+                'posts:group_list', kwargs={'slug': group.slug}
+            ),
+            'profile': reverse(
+                'posts:profile', kwargs={'username': author.username}
+            ),
+            'post_detail': reverse(
+                'posts:post_detail', kwargs={'post_id': post.pk}
+            ),
+            'follow_index': reverse('posts:follow_index'),
+        }
+
+    def measure(self, client, url, options):
+        latencies = []
+        queries = []
+        sql = []
+        templates = []
+        for iteration in range(options['warmup'] + options['iterations']):
+            if options['cold']:
+                cache.clear()
+            with sql_timer() as sql_stats, template_timer() as template_time:
+                started = time.perf_counter()
+                response = client.get(url)
+                elapsed = time.perf_counter() - started
+            if response.status_code != 200:
+                raise CommandError(f'{url} ответил {response.status_code}')
+            if iteration < options['warmup']:
+                continue
+            latencies.append(elapsed * 1000)
+            queries.append(sql_stats['queries'])
+            sql.append(sql_stats['seconds'] * 1000)
+            templates.append(template_time[0] * 1000)
+        # Трассировка памяти замедляет запрос, поэтому отдельный проход.
+        if options['cold']:
+            cache.clear()
+        tracemalloc.start()
+        client.get(url)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return {
+            'p50_ms': round(statistics.median(latencies), 3),
+            'p95_ms': round(percentile(latencies, 0.95), 3),
+            'p99_ms': round(percentile(latencies, 0.99), 3),
+            'queries': statistics.median(queries),
+            'sql_ms': round(statistics.median(sql), 3),
+            'template_ms': round(statistics.median(templates), 3),
+            'peak_kb': round(peak / 1024, 1),
+        }
+
+    def run(self, options):
+        reader, urls = self.targets()
+        # Адрес не из INTERNAL_IPS, чтобы не встраивалась debug-панель.
+        client = Client(REMOTE_ADDR='192.0.2.1')
+        client.force_login(reader)
+        return {
+            'meta': {
+                'revision': git_revision(),
+                'created': timezone.now().isoformat(),
+                'iterations': options['iterations'],
+                'cold': options['cold'],
+                'posts': Post.objects.count(),
+                'users': User.objects.count(),
+                'follows': Follow.objects.count(),
+            },
+            'views': {
+                name: self.measure(client, url, options)
+                for name, url in urls.items()
+            },
+        }
+
+    def report(self, result):
+        self.stdout.write(
+            f'{"view":<14}' + ''.join(f'{metric:>13}' for metric in METRICS)
+        )
+        for name, metrics in result['views'].items():
+            self.stdout.write(f'{name:<14}' + ''.join(
+                f'{metrics[metric]:>13}' for metric in METRICS
+            ))
+
+    def compare(self, baseline, current):
+        self.stdout.write(
+            f'Сравнение {baseline["meta"].get("revision")} '
+            f'-> {current["meta"].get("revision")}'
+        )
+        for name, metrics in current['views'].items():
+            old = baseline['views'].get(name)
+            if old is None:
+                continue
+            for metric in METRICS:
+                before, after = old[metric], metrics[metric]
+                change = (after - before) / before * 100 if before else 0
+                self.stdout.write(
+                    f'{name:<14}{metric:<12}{before:>12}{after:>12}'
+                    f'{change:>+9.1f}%'
+                )
@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from posts import garbage
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки постов, на которые больше никто не ссылается, '
+        'и миниатюры без исходников. Подходит для запуска по расписанию.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=float, default=24,
+            help='Сколько часов не трогать свежие и отпущенные файлы.',
+        )
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать, что было бы удалено.',
+        )
+
+    def handle(self, *args, **options):
+        collector = garbage.collect(
+            grace=timedelta(hours=options['grace']),
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+        verb = 'Можно удалить' if options['dry_run'] else 'Удалено'
+        self.stdout.write(
+            f'{verb} оригиналов: {collector.originals}, '
+            f'миниатюр: {collector.thumbnails}, '
+            f'байт: {collector.bytes}'
+        )
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает посты, комментарии и картинки пользователя в '
+        'zip-архив, не собирая его в памяти.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument(
+            '--output', help='Путь к архиву; по умолчанию <username>.zip.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(
+                f'Нет пользователя {options["username"]}'
+            )
+        path = options['output'] or f'{user.username}.zip'
+        size = 0
+        with open(path, 'wb') as archive:
+            for chunk in export.stream(user):
+                archive.write(chunk)
+                size += len(chunk)
+        self.stdout.write(f'Архив {path}: {size} байт')
@@ -0,0 +1,242 @@
+import csv
+import itertools
+import json
+import sys
+import time
+from contextlib import ExitStack
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts.bulk import batched, finish_load, own_dates
+from posts.models import Comment, Follow, Group, Post, User
+
+
+def read_jsonl(stream):
+    # Пустые строки тоже выдаются, чтобы смещение совпадало с номером
+    # строки файла.
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        try:
+            yield json.loads(line) if line else None
+        except ValueError:
+            raise CommandError(f'Строка {number}: неверный JSON')
+
+
+def read_csv(stream):
+    # Первая строка CSV — заголовок с названиями полей.
+    for row in csv.DictReader(stream):
+        # Пустые ячейки CSV означают отсутствие значения.
+        yield {key: value for key, value in row.items() if value}
+
+
+READERS = {'jsonl': read_jsonl, 'csv': read_csv}
+
+
+class LookupMap:
+    """Id объектов по естественному ключу, запрошенные порциями.
+
+    Ключи, которых нет в базе, создаются одним bulk_create через
+    `build`. Найденное остаётся в памяти до конца импорта.
+    """
+
+    def __init__(self, model, field, build):
+        self.model = model
+        self.field = field
+        self.build = build
+        self.ids = {}
+
+    def load(self, keys):
+        missing = set(keys) - self.ids.keys() - {None}
+        if not missing:
+            return
+        self._fetch(missing)
+        created = missing - self.ids.keys()
+        if created:
+            self.model.objects.bulk_create(
+                [self.build(key) for key in sorted(created)]
+            )
+            self._fetch(created)
+
+    def _fetch(self, keys):
+        self.ids.update(
+            self.model.objects.filter(**{f'{self.field}__in': keys})
+            .values_list(self.field, 'pk')
+        )
+
+    def get(self, key):
+        return self.ids.get(key)
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково загружает посты, комментарии и подписки из JSONL или '
+        'CSV порциями через bulk_create. Поле type записи — post, '
+        'comment или follow; авторы и подписчики задаются по username, '
+        'группы — по slug, а комментарии ссылаются на id поста, который '
+        'сохраняется при загрузке. Поэтому посты загружаются в базу, где '
+        'постов с такими id нет: обычно в пустую. Прерванную загрузку '
+        'можно продолжить с выведенного смещения через --offset.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл с данными; «-» читает стандартный ввод.',
+        )
+        parser.add_argument(
+            '--format', choices=sorted(READERS),
+            help='Формат файла; по умолчанию берётся из расширения.',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--offset', type=int, default=0,
+            help='Сколько строк пропустить: смещение прошлого запуска.',
+        )
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or options['path'].rsplit('.', 1)[-1]
+        if fmt not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {fmt}')
+        self.batch_size = options['batch_size']
+        password = make_password(None)
+        self.users = LookupMap(
+            User, 'username',
+            lambda username: User(username=username, password=password),
+        )
+        self.groups = LookupMap(
+            Group, 'slug', lambda slug: Group(title=slug, slug=slug),
+        )
+        with ExitStack() as stack:
+            if options['path'] == '-':
+                stream = sys.stdin
+            else:
+                stream = stack.enter_context(
+                    open(options['path'], encoding='utf-8', newline='')
+                )
+            self.load(READERS[fmt](stream), options['offset'])
+        ids = User.objects.order_by('pk').values_list('pk', flat=True)
+        finish_load(ids.iterator(), self.batch_size, self.stdout)
+
+    def load(self, records, offset):
+        rows = itertools.islice(records, offset, None)
+        started = time.monotonic()
+        total = 0
+        for batch in batched(rows, self.batch_size):
+            with transaction.atomic():
+                self.write(batch, offset + total)
+            total += len(batch)
+            rate = total / max(time.monotonic() - started, 1e-6)
+            self.stdout.write(
+                f'Записано строк: {total}, смещение: {offset + total}, '
+                f'{rate:.0f} строк/с'
+            )
+
+    def write(self, batch, offset):
+        # Записи каждого типа хранятся вместе с номером строки для ошибок.
+        posts, comments, follows = [], [], []
+        kinds = {'post': posts, 'comment': comments, 'follow': follows}
+        for number, record in enumerate(batch, offset + 1):
+            if record is None:
+                continue
+            try:
+                kinds[record['type']].append((number, record))
+            except (KeyError, TypeError):
+                raise CommandError(f'Строка {number}: неизвестный тип записи')
+        self.users.load(itertools.chain(
+            (
+                record.get('author')
+                for _, record in posts + comments + follows
+            ),
+            (record.get('user') for _, record in follows),
+        ))
+        self.groups.load(record.get('group') for _, record in posts)
+        self.check_post_ids(posts, comments)
+        now = timezone.now()
+        with own_dates(Post, 'pub_date'), own_dates(Comment, 'created'):
+            # Посты пишутся первыми: на них ссылаются комментарии порции.
+            Post.objects.bulk_create([
+                Post(
+                    pk=record.get('id'),
+                    author_id=self.user_id(number, record, 'author'),
+                    group_id=self.groups.get(record.get('group')),
+                    text=record.get('text', ''),
+                    pub_date=self.date(number, record, 'pub_date', now),
+                )
+                for number, record in posts
+            ])
+            Comment.objects.bulk_create([
+                Comment(
+                    post_id=record['post'],
+                    author_id=self.user_id(number, record, 'author'),
+                    text=record.get('text', ''),
+                    created=self.date(number, record, 'created', now),
+                )
+                for number, record in comments
+            ])
+        Follow.objects.bulk_create([
+            Follow(
+                user_id=self.user_id(number, record, 'user'),
+                author_id=self.user_id(number, record, 'author'),
+            )
+            for number, record in follows
+            if record.get('user') != record.get('author')
+        ], ignore_conflicts=True)
+
+    def check_post_ids(self, posts, comments):
+        """Проверяет id постов порции одним запросом к базе.
+
+        Id новых постов не должны быть заняты, а комментарии должны
+        ссылаться на уже загруженные посты или на посты этой порции.
+        """
+        for number, record in comments:
+            if record.get('post') is None:
+                raise CommandError(f'Строка {number}: комментарий без post')
+        new_ids = {
+            number: self.post_id(number, record['id'])
+            for number, record in posts if record.get('id') is not None
+        }
+        referenced = {
+            number: self.post_id(number, record['post'])
+            for number, record in comments
+        }
+        existing = set(
+            Post.objects.filter(
+                pk__in={*new_ids.values(), *referenced.values()}
+            ).values_list('pk', flat=True)
+        )
+        for number, pk in new_ids.items():
+            if pk in existing:
+                raise CommandError(f'Строка {number}: пост с id {pk} уже есть')
+        known = existing | set(new_ids.values())
+        for number, pk in referenced.items():
+            if pk not in known:
+                raise CommandError(f'Строка {number}: нет поста с id {pk}')
+
+    def post_id(self, number, value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise CommandError(f'Строка {number}: неверный id поста {value}')
+
+    def user_id(self, number, record, field):
+        user_id = self.users.get(record.get(field))
+        if user_id is None:
+            raise CommandError(
+                f'Строка {number}: запись без пользователя в поле {field}'
+            )
+        return user_id
+
+    def date(self, number, record, field, default):
+        if not record.get(field):
+            return default
+        value = parse_datetime(record[field])
+        if value is None:
+            raise CommandError(
+                f'Строка {number}: неверная дата {record[field]}'
+            )
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        return value
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.bulk import pk_chunks
+from posts.counters import (reconcile_authors, reconcile_comments,
+                            reconcile_images)
+from posts.models import Post, StoredImage, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет денормализованные счётчики постов, подписок, '
+        'комментариев и ссылок на картинки с данными и исправляет '
+        'разошедшиеся.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        size = options['chunk_size']
+        authors = comments = images = 0
+        for ids in pk_chunks(User.objects.all(), size):
+            with transaction.atomic():
+                authors += reconcile_authors(ids)
+        for ids in pk_chunks(Post.objects.all(), size):
+            names = set(
+                Post.objects.filter(pk__in=ids).exclude(image='')
+                .values_list('image', flat=True)
+            )
+            with transaction.atomic():
+                comments += reconcile_comments(ids)
+                images += reconcile_images(list(names))
+        # Файлы, на которые больше не ссылается ни один пост.
+        for names in pk_chunks(StoredImage.objects.filter(refs__gt=0), size):
+            with transaction.atomic():
+                images += reconcile_images(names)
+        self.stdout.write(
+            f'Исправлено счётчиков пользователей: {authors}, '
+            f'постов: {comments}, картинок: {images}'
+        )
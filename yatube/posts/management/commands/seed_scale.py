@@ -0,0 +1,208 @@
+import io
+import itertools
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from posts.bulk import batched, finish_load, own_dates
+from posts.models import Comment, Follow, Group, Post, User
+
+IMAGE_VARIANTS = 8
+
+
+def zipf_weights(count, exponent):
+    """Накопленные веса закона Ципфа: первый элемент самый популярный."""
+    return list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)
+    ))
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу большим синтетическим набором данных с '
+        'перекосом популярности. Одинаковый --seed даёт одинаковые данные.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=50000)
+        parser.add_argument('--follows', type=int, default=20000)
+        parser.add_argument('--images', type=float, default=0.1,
+                            help='Доля постов с картинкой.')
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько дней до сегодня идут посты.')
+        parser.add_argument('--exponent', type=float, default=1.1,
+                            help='Показатель закона Ципфа для перекоса.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        counts = ('users', 'groups', 'posts', 'comments', 'follows')
+        for name in counts:
+            if options[name] < 0:
+                raise CommandError(f'--{name} не может быть меньше нуля')
+        if not options['users'] and any(
+            options[name] for name in ('posts', 'comments', 'follows')
+        ):
+            raise CommandError(
+                'Посты, комментарии и подписки без пользователей не создать:'
+                ' задайте --users больше нуля.'
+            )
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        self.batch_size = options['batch_size']
+        self.prefix = f's{options["seed"]}'
+        users = self.create_users()
+        groups = self.create_groups()
+        images = self.create_images() if options['images'] else []
+        posts = self.create_posts(users, groups, images)
+        self.create_comments(users, posts)
+        self.create_follows(users)
+        finish_load(users, self.batch_size, self.stdout)
+
+    def insert(self, model, objects, label):
+        total = 0
+        with transaction.atomic():
+            for batch in batched(objects, self.batch_size):
+                model.objects.bulk_create(batch)
+                total += len(batch)
+        self.stdout.write(f'{label}: {total}')
+
+    def new_ids(self, model, before):
+        """Диапазон id, выданных после `before`.
+
+        Вставка идёт в одной транзакции, поэтому id идут подряд.
+        """
+        ids = model.objects.filter(pk__gt=before).order_by('pk')
+        first = ids.values_list('pk', flat=True).first()
+        last = ids.values_list('pk', flat=True).last()
+        return range(first, last + 1) if first else range(0)
+
+    def last_id(self, model):
+        return model.objects.order_by('pk').values_list(
+            'pk', flat=True
+        ).last() or 0
+
+    def create_users(self):
+        before = self.last_id(User)
+        password = make_password(None)
+        self.insert(User, (
+            User(
+                username=f'{self.prefix}_user{number}',
+                first_name=f'Имя{number}',
+                last_name=f'Фамилия{number}',
+                password=password,
+            )
+            for number in range(self.options['users'])
+        ), 'Пользователи')
+        return self.new_ids(User, before)
+
+    def create_groups(self):
+        before = self.last_id(Group)
+        self.insert(Group, (
+            Group(
+                title=f'Группа {number}',
+                slug=f'{self.prefix}-group-{number}',
+                description=f'Описание группы {number}',
+            )
+            for number in range(self.options['groups'])
+        ), 'Группы')
+        return self.new_ids(Group, before)
+
+    def create_images(self):
+        # Хранилище картинок кладёт одинаковое содержимое в один файл,
+        # поэтому повторный запуск новых файлов не создаёт.
+        storage = Post._meta.get_field('image').storage
+        names = []
+        for number in range(IMAGE_VARIANTS):
+            color = tuple(self.rng.randrange(256) for _ in range(3))
+            buffer = io.BytesIO()
+            Image.new('RGB', (1280, 720), color).save(buffer, 'JPEG')
+            names.append(storage.save(
+                f'posts/{self.prefix}-{number}.jpg',
+                ContentFile(buffer.getvalue()),
+            ))
+        return names
+
+    def pick(self, ids, weights, count):
+        """`count` id из `ids`, первые выпадают чаще остальных."""
+        if not count:
+            return []
+        return [
+            ids[index] for index in self.rng.choices(
+                range(len(ids)), cum_weights=weights, k=count
+            )
+        ]
+
+    def create_posts(self, users, groups, images):
+        count = self.options['posts']
+        before = self.last_id(Post)
+        author_weights = zipf_weights(len(users), self.options['exponent'])
+        group_weights = zipf_weights(len(groups), self.options['exponent'])
+        span = timedelta(days=self.options['days'])
+        start = timezone.now() - span
+        step = span / max(count, 1)
+
+        def posts():
+            for number in range(count):
+                author_id, = self.pick(users, author_weights, 1)
+                group_id = None
+                if groups and self.rng.random() < 0.7:
+                    group_id, = self.pick(groups, group_weights, 1)
+                image = ''
+                if images and self.rng.random() < self.options['images']:
+                    image = self.rng.choice(images)
+                yield Post(
+                    author_id=author_id,
+                    group_id=group_id,
+                    text=f'Пост {number} ' * self.rng.randint(1, 20),
+                    pub_date=start + step * number,
+                    image=image,
+                )
+
+        with own_dates(Post, 'pub_date'):
+            self.insert(Post, posts(), 'Посты')
+        return self.new_ids(Post, before)
+
+    def create_comments(self, users, posts):
+        if not posts:
+            return
+        post_weights = zipf_weights(len(posts), self.options['exponent'])
+        self.insert(Comment, (
+            Comment(
+                post_id=post_id,
+                author_id=self.rng.choice(users),
+                text=f'Комментарий {number}',
+            )
+            for number, post_id in enumerate(self.pick(
+                posts, post_weights, self.options['comments']
+            ))
+        ), 'Комментарии')
+
+    def create_follows(self, users):
+        author_weights = zipf_weights(len(users), self.options['exponent'])
+        pairs = set()
+        for author_id in self.pick(
+            users, author_weights, self.options['follows']
+        ):
+            user_id = self.rng.choice(users)
+            if user_id != author_id:
+                pairs.add((user_id, author_id))
+        total = 0
+        with transaction.atomic():
+            for batch in batched(sorted(pairs), self.batch_size):
+                Follow.objects.bulk_create(
+                    [Follow(user_id=user, author_id=author)
+                     for user, author in batch],
+                    ignore_conflicts=True,
+                )
+                total += len(batch)
+        self.stdout.write(f'Подписки: {total}')
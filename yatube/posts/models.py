@@ -2,6 +2,8 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from core.storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -14,6 +16,32 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self, with_comments=False):
+        """Посты с тем, что выводят карточки, за постоянное число запросов.
+
+        Автор и группа приходят одним JOIN, лишние колонки не читаются.
+        `with_comments` подгружает комментарии вместе с их авторами.
+        """
+        queryset = self.select_related('author', 'group').only(
+            'text', 'pub_date', 'image', 'author_id', 'group_id',
+            'author__username', 'author__first_name', 'author__last_name',
+            'group__slug', 'group__title',
+        )
+        if with_comments:
+            queryset = queryset.prefetch_related(models.Prefetch(
+                'comments',
+                queryset=Comment.objects.select_related('author').only(
+                    'text', 'post_id', 'author_id', 'author__username',
+                ),
+            ))
+        return queryset
+
+
+# Денормализованные счётчики поста, которые Post.save() не пишет.
+COUNTER_FIELDS = ('comment_count',)
+
+
 class Post(models.Model):
     text = models.TextField(
         'Текст поста',
@@ -41,15 +69,90 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
-        blank=True
+        blank=True,
+        storage=ContentAddressedStorage(),
+    )
+    comment_count = models.IntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False,
     )
 
+    objects = PostQuerySet.as_manager()
+
     class Meta:
         ordering = ['-pub_date']
+        # Ленты выбираются по ключу (pub_date, id) внутри автора или
+        # группы; id в индексе избавляет от сортировки во временном дереве.
+        indexes = [
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_date_idx',
+            ),
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_date_idx',
+            ),
+            # Сверка ссылок на картинки и сборщик мусора ищут посты по
+            # имени файла порциями; без индекса каждая порция обходит
+            # всю таблицу.
+            models.Index(fields=['image'], name='post_image_idx'),
+        ]
 
     def __str__(self):
         return self.text[:settings.FIRST_FIFTEEN_CHARS]
 
+    def save(self, *args, **kwargs):
+        # Счётчики меняются только через F() в posts.counters. Обычное
+        # сохранение загруженного поста их не пишет, иначе старое
+        # значение затёрло бы комментарии, добавленные за это время.
+        if (not self._state.adding and not kwargs.get('force_insert')
+                and kwargs.get('update_fields') is None):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+
+class StoredImage(models.Model):
+    """Файл картинки в хранилище по содержимому и число постов с ним.
+
+    Одну картинку делят все посты, загрузившие одинаковые байты.
+    `released` — момент, когда ссылок на файл не осталось.
+    """
+    name = models.CharField(max_length=100, primary_key=True)
+    refs = models.IntegerField('Ссылок', default=0)
+    released = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.name
+
+
+class PostImageVariant(models.Model):
+    """Уменьшенная WebP-копия картинки поста одной ширины.
+
+    Варианты создаются один раз после загрузки картинки; `source`
+    хранит имя картинки, из которой они сделаны, чтобы после её замены
+    старые варианты не выводились.
+    """
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='image_variants',
+    )
+    source = models.CharField(max_length=100)
+    kind = models.CharField(max_length=16)
+    width = models.PositiveIntegerField()
+    name = models.CharField(max_length=255)
+
+    def __str__(self):
+        return self.name
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -75,10 +178,12 @@ class Comment(models.Model):
 
 
 class Follow(models.Model):
+    # Поиск по user обслуживает уникальный индекс (user, author).
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='follower',
+        db_index=False,
     )
     author = models.ForeignKey(
         User,
@@ -86,5 +191,90 @@ class Follow(models.Model):
         related_name='following',
     )
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_follow',
+            ),
+        ]
+
     def __str__(self):
         return f'{self.user} follows {self.author}'
+
+
+class TimelineEntry(models.Model):
+    """Строка материализованной ленты подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_date_idx',
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='timeline_user_author_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id} in feed of {self.user}'
+
+
+class PopularAuthor(models.Model):
+    """Автор, чьи посты не раскладываются по лентам подписчиков.
+
+    Ленты его подписчиков подмешивают такие посты при чтении.
+    """
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='popular',
+    )
+
+    def __str__(self):
+        return str(self.author)
+
+
+class AuthorCounters(models.Model):
+    """Счётчики пользователя, которые иначе считались бы COUNT(*).
+
+    Меняются сигналами через F-выражения, а разошедшиеся с данными
+    значения исправляет команда `reconcile_counters`.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+    )
+    posts = models.IntegerField('Постов', default=0)
+    followers = models.IntegerField('Подписчиков', default=0)
+    following = models.IntegerField('Подписок', default=0)
+
+    def __str__(self):
+        return f'counters of {self.user}'
@@ -0,0 +1,286 @@
+import base64
+import hashlib
+import math
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.shortcuts import redirect
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from posts import search
+from posts.counts import estimated_count
+from posts.models import Post
+
+
+def _pack(*parts):
+    raw = '|'.join(map(str, parts)).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _unpack(token):
+    raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+    return raw.decode().split('|')
+
+
+# Целые SQLite знаковые 64-битные: большее число база не примет.
+SQLITE_MAX_INT = 2 ** 63 - 1
+
+
+def _int(value):
+    number = int(value)
+    if abs(number) > SQLITE_MAX_INT:
+        raise ValueError(f'Число вне диапазона SQLite: {value}')
+    return number
+
+
+def encode_cursor(pub_date, pk):
+    """Упаковывает ключ (pub_date, id) в непрозрачный токен для URL."""
+    return _pack(pub_date.isoformat(), pk)
+
+
+def decode_cursor(token):
+    """Распаковывает токен курсора; для битого токена возвращает None."""
+    try:
+        pub_date, pk = _unpack(token)
+        pub_date, pk = parse_datetime(pub_date), _int(pk)
+    except (ValueError, TypeError, UnicodeError):
+        return None
+    # Подделанный токен может нести дату неверного вида.
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+class CursorPaginator(Paginator):
+    """Паджинатор по ключу (pub_date, id) вместо LIMIT/OFFSET.
+
+    Страница выбирается диапазонным условием по индексу, поэтому время
+    ответа не зависит от глубины листания. Номеров страниц у ленты нет:
+    `Page.number` равен 1 для первой страницы и 2 для любой следующей,
+    а переходы строятся по `next_cursor` и `previous_cursor`.
+
+    COUNT(*) паджинатор не выполняет: наличие следующей страницы
+    узнаётся по лишней выбранной строке, а `count` берётся из
+    закешированной оценки по ключу `count_key`.
+    """
+
+    def __init__(self, object_list, per_page, date_field='pub_date',
+                 count_key=None):
+        super().__init__(object_list, per_page)
+        self.date_field = date_field
+        self.count_key = count_key
+        self.next_cursor = None
+        self.previous_cursor = None
+        self._num_pages = 1
+
+    @property
+    def num_pages(self):
+        return self._num_pages
+
+    @cached_property
+    def count(self):
+        if self.count_key is None:
+            return None
+        return estimated_count(self.count_key, self.object_list)
+
+    def _slice_source(self, queryset, field, cursor, backwards,
+                      pk_field='pk', where=None):
+        conditions = [] if where is None else [where]
+        if cursor is not None:
+            pub_date, pk = cursor
+            # Условие записано как диапазон по дате, уточнённый по id:
+            # так SQLite идёт по индексу и не сортирует выборку заново.
+            lookup = 'gt' if backwards else 'lt'
+            conditions.append(
+                (
+                    Q(**{f'{field}__{lookup}': pub_date})
+                    | Q(**{f'{pk_field}__{lookup}': pk})
+                ) & Q(**{f'{field}__{lookup}e': pub_date})
+            )
+        if conditions:
+            # Один вызов filter(): условия на многозначную связь в
+            # разных вызовах присоединили бы её заново, без `where`.
+            queryset = queryset.filter(*conditions)
+        if backwards:
+            ordering = (field, pk_field)
+        else:
+            ordering = (f'-{field}', f'-{pk_field}')
+        return list(queryset.order_by(*ordering)[:self.per_page + 1])
+
+    def _slice(self, cursor, backwards=False):
+        return self._slice_source(
+            self.object_list, self.date_field, cursor, backwards
+        )
+
+    def row_cursor(self, row):
+        """Токен курсора, указывающий на строку `row`."""
+        return encode_cursor(row.pub_date, row.pk)
+
+    def parse_cursor(self, token):
+        return decode_cursor(token)
+
+    def get_page(self, after=None, before=None):
+        """Возвращает страницу после курсора `after` или перед `before`."""
+        after = self.parse_cursor(after) if after else None
+        before = self.parse_cursor(before) if before and not after else None
+        rows = self._slice(before, backwards=True) if before else []
+        if rows:
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_next = True
+        else:
+            rows = self._slice(after)
+            has_previous = after is not None
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+        if rows and has_previous:
+            self.previous_cursor = self.row_cursor(rows[0])
+        if rows and has_next:
+            self.next_cursor = self.row_cursor(rows[-1])
+        number = 2 if has_previous else 1
+        self._num_pages = number + 1 if self.next_cursor else number
+        return self._get_page(rows, number, self)
+
+
+class MergedCursorPaginator(CursorPaginator):
+    """Курсорный паджинатор поверх нескольких непересекающихся выборок.
+
+    `sources` — список четвёрок (queryset, поле даты, поле id поста,
+    условие): поля задают ключ так, чтобы он читался из индекса самой
+    выборки. Условие (Q или None) ставится в один filter() с курсором,
+    чтобы ключ и условие относились к одной строке связи. С
+    каждой выборки берётся не больше страницы плюс одна строка,
+    результаты сливаются по ключу (pub_date, id).
+    """
+
+    def __init__(self, sources, per_page):
+        super().__init__(sources[0][0], per_page)
+        self.sources = sources
+
+    def _slice(self, cursor, backwards=False):
+        rows = []
+        for queryset, field, pk_field, where in self.sources:
+            rows.extend(self._slice_source(
+                queryset, field, cursor, backwards, pk_field, where
+            ))
+        rows.sort(key=lambda post: (post.pub_date, post.pk),
+                  reverse=not backwards)
+        return rows[:self.per_page + 1]
+
+
+class SearchPaginator(CursorPaginator):
+    """Курсорный паджинатор по результатам полнотекстового поиска.
+
+    Ключ страницы — (ранг bm25, id): страницы идут от самых
+    релевантных постов, и глубина листания не влияет на время ответа.
+    Ранг поста выставляется в `post.search_rank`.
+    """
+
+    def __init__(self, query, per_page):
+        super().__init__(Post.objects.none(), per_page)
+        self.query = query
+
+    def row_cursor(self, row):
+        return _pack(row.search_rank, row.pk)
+
+    def parse_cursor(self, token):
+        try:
+            rank, pk = _unpack(token)
+            rank, pk = float(rank), _int(pk)
+        except (ValueError, TypeError, UnicodeError):
+            return None
+        # inf и nan не сравниваются с рангами как числа.
+        return (rank, pk) if math.isfinite(rank) else None
+
+    def _slice(self, cursor, backwards=False):
+        ranks = search.ranked(
+            self.query, cursor, backwards, self.per_page + 1
+        )
+        posts = Post.objects.for_feed().in_bulk([pk for pk, _ in ranks])
+        rows = []
+        for pk, rank in ranks:
+            # Пост мог быть удалён между двумя запросами.
+            if pk in posts:
+                posts[pk].search_rank = rank
+                rows.append(posts[pk])
+        return rows
+
+
+class EstimatedCountPaginator(Paginator):
+    """Паджинатор списков админки без точного COUNT(*) на больших таблицах.
+
+    Пока в таблице не больше `ADMIN_EXACT_COUNT_LIMIT` записей, строки
+    считаются честно. Дальше число строк выборки берётся из оценки
+    `estimated_count` под ключом, зависящим от её SQL: фильтр считается
+    один раз и пересчитывается в фоне, а не при каждом открытии списка.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        label = queryset.model._meta.label_lower
+        total = estimated_count(
+            f'admin:{label}', queryset.model._default_manager.all()
+        )
+        if total <= settings.ADMIN_EXACT_COUNT_LIMIT:
+            return queryset.count()
+        if not queryset.query.where:
+            return total
+        digest = hashlib.md5(str(queryset.query).encode()).hexdigest()
+        return estimated_count(f'admin:{label}:{digest}', queryset)
+
+
+def _get_page(request, paginator):
+    return paginator.get_page(
+        request.GET.get('after'),
+        request.GET.get('before'),
+    )
+
+
+def paginate(request, post_list, count_key=None):
+    """Возвращает страницу ленты по курсорам из GET-параметров."""
+    paginator = CursorPaginator(
+        post_list, settings.ARTICLES_SELECTION, count_key=count_key
+    )
+    return _get_page(request, paginator)
+
+
+def paginate_sources(request, sources):
+    """То же, что `paginate`, но для ленты из нескольких выборок."""
+    paginator = MergedCursorPaginator(sources, settings.ARTICLES_SELECTION)
+    return _get_page(request, paginator)
+
+
+def paginate_search(request, text):
+    """Страница результатов поиска по строке `text`."""
+    paginator = SearchPaginator(
+        search.fts_query(text), settings.ARTICLES_SELECTION
+    )
+    return _get_page(request, paginator)
+
+
+def legacy_page_redirect(request, post_list):
+    """Переадресует старые ссылки вида ?page=N на курсорные.
+
+    Возвращает None, если в запросе нет параметра `page`.
+    """
+    if 'page' not in request.GET:
+        return None
+    params = request.GET.copy()
+    page = params.pop('page')[0]
+    try:
+        number = int(page)
+        offset = _int((number - 1) * settings.ARTICLES_SELECTION - 1)
+    except ValueError:
+        number = 1
+    if number > 1:
+        edge = post_list.order_by('-pub_date', '-pk').values_list(
+            'pub_date', 'pk'
+        )[offset:offset + 1]
+        if edge:
+            params['after'] = encode_cursor(*edge[0])
+    url = request.path
+    if params:
+        url = f'{url}?{params.urlencode()}'
+    return redirect(url)
@@ -0,0 +1,94 @@
+"""Полнотекстовый поиск по постам на FTS5.
+
+Индекс `posts_post_fts` заполняют триггеры на таблице постов (см.
+миграцию `0027_post_search`), поэтому в него попадают и посты,
+созданные через bulk_create. Токенизатор unicode61 приводит к одному
+регистру и кириллицу, а «ё» сводится к «е» при записи и при поиске.
+"""
+import re
+
+from django.db import connection
+
+# Сколько слов запроса учитывается, чтобы запрос оставался дешёвым.
+MAX_TERMS = 8
+# Слова короче ищутся целиком: у коротких префиксов слишком много слов.
+MIN_STEM = 3
+# Окончания, которые отбрасываются, чтобы «котики» находили «котик».
+ENDINGS = sorted((
+    'иями', 'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими',
+    'ах', 'ях', 'ов', 'ев', 'ей', 'ой', 'ом', 'ем', 'ам', 'ям', 'ую',
+    'юю', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ый', 'ий', 'ых', 'их',
+    'а', 'я', 'ы', 'и', 'у', 'ю', 'е', 'о', 'ь',
+), key=len, reverse=True)
+
+RANKED_SQL = (
+    'SELECT id, rank FROM ('
+    ' SELECT rowid AS id, bm25(posts_post_fts) AS rank'
+    ' FROM posts_post_fts WHERE posts_post_fts MATCH %s'
+    ') {where} ORDER BY rank {order}, id {order} LIMIT %s'
+)
+
+
+def fold(text):
+    return text.lower().replace('ё', 'е')
+
+
+def _stem(word):
+    for ending in ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+def fts_query(text):
+    """Выражение MATCH для запроса пользователя или '' без слов.
+
+    Слова соединяются через AND; слова не короче `MIN_STEM` ищутся по
+    основе как префиксу. Кавычки убирают синтаксис FTS5 из запроса.
+    """
+    terms = []
+    for word in re.findall(r'\w+', fold(text))[:MAX_TERMS]:
+        if len(word) < MIN_STEM:
+            terms.append(f'"{word}"')
+        else:
+            terms.append(f'"{_stem(word)}"*')
+    return ' '.join(terms)
+
+
+def ranked(query, cursor=None, backwards=False, limit=10):
+    """Пары (id поста, ранг bm25) по убыванию релевантности.
+
+    `cursor` — пара (ранг, id), после которой (или до которой при
+    `backwards`) начинается выборка. Меньший ранг релевантнее.
+    """
+    if not query:
+        return []
+    params = [query]
+    where = ''
+    if cursor is not None:
+        where = 'WHERE (rank, id) {} (%s, %s)'.format(
+            '<' if backwards else '>'
+        )
+        params.extend(cursor)
+    params.append(limit)
+    sql = RANKED_SQL.format(where=where, order='DESC' if backwards else '')
+    with connection.cursor() as db:
+        db.execute(sql, params)
+        return db.fetchall()
+
+
+def matching(queryset, text):
+    """Посты выборки, подходящие под запрос, без учёта ранга."""
+    query = fts_query(text)
+    if not query:
+        return queryset.none()
+    # pk__in=RawSQL(...) оборачивает подзапрос в лишние скобки, и SQLite
+    # читает его как скалярный: берётся только первая строка.
+    table = connection.ops.quote_name(queryset.model._meta.db_table)
+    return queryset.extra(
+        where=[
+            f'{table}.id IN (SELECT rowid FROM posts_post_fts '
+            'WHERE posts_post_fts MATCH %s)'
+        ],
+        params=[query],
+    )
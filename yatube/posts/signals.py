@@ -0,0 +1,206 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from posts import thumbnails, timeline
+from posts.cache import (author_name_namespace, author_namespace, bump,
+                         forget_post_page, group_namespace,
+                         group_page_namespace, index_namespace,
+                         post_namespace, post_namespaces)
+from posts.counters import (change_author_counters, change_comment_count,
+                            change_image_refs)
+from posts.counts import adjust_counts, group_count_key, post_count_keys
+from posts.models import Comment, Follow, Group, Post, User
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_values(sender, instance, **kwargs):
+    """Запоминает автора, группу и картинку поста до сохранения.
+
+    По ним сигналы замечают смену автора или группы и замену картинки.
+    """
+    instance._previous_author_id = None
+    instance._previous_group_id = None
+    instance._previous_image = ''
+    if instance.pk:
+        previous = Post.objects.filter(pk=instance.pk).values_list(
+            'author_id', 'group_id', 'image'
+        ).first()
+        if previous is not None:
+            (
+                instance._previous_author_id,
+                instance._previous_group_id,
+                instance._previous_image,
+            ) = previous
+
+
+@receiver(pre_save, sender=Group)
+def remember_previous_slug(sender, instance, **kwargs):
+    # Страницы под старым слагом тоже нужно сбросить.
+    instance._previous_slug = None
+    if instance.pk:
+        instance._previous_slug = Group.objects.filter(
+            pk=instance.pk
+        ).values_list('slug', flat=True).first()
+
+
+@receiver(pre_save, sender=User)
+def remember_previous_username(sender, instance, update_fields, **kwargs):
+    # Страницы под старым именем тоже нужно сбросить.
+    instance._previous_username = None
+    if instance.pk and update_fields != frozenset({'last_login'}):
+        instance._previous_username = User.objects.filter(
+            pk=instance.pk
+        ).values_list('username', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    if created:
+        adjust_counts(post_count_keys(instance), 1)
+        change_author_counters(instance.author_id, posts=1)
+        timeline.fan_out(instance)
+        return
+    previous_author_id = getattr(instance, '_previous_author_id', None)
+    if previous_author_id and previous_author_id != instance.author_id:
+        # Автора поста можно сменить в админке.
+        change_author_counters(previous_author_id, posts=-1)
+        change_author_counters(instance.author_id, posts=1)
+        timeline.reassign(instance)
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    if previous_group_id != instance.group_id:
+        if previous_group_id:
+            adjust_counts([group_count_key(previous_group_id)], -1)
+        if instance.group_id:
+            adjust_counts([group_count_key(instance.group_id)], 1)
+
+
+@receiver(post_save, sender=Post)
+def count_image_refs(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_image', '')
+    current = instance.image.name or ''
+    if previous == current:
+        return
+    if previous:
+        change_image_refs(previous, -1)
+    if current:
+        change_image_refs(current, 1)
+
+
+@receiver(post_save, sender=Post)
+def prepare_thumbnails(sender, instance, **kwargs):
+    thumbnails.schedule(instance)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    adjust_counts(post_count_keys(instance), -1)
+    change_author_counters(instance.author_id, posts=-1)
+    if instance.image:
+        change_image_refs(instance.image.name, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, **kwargs):
+    if created:
+        change_author_counters(instance.author_id, followers=1)
+        change_author_counters(instance.user_id, following=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_unfollow(sender, instance, **kwargs):
+    change_author_counters(instance.author_id, followers=-1)
+    change_author_counters(instance.user_id, following=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, **kwargs):
+    if created:
+        change_comment_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    change_comment_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    timeline.prune(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_pages(sender, instance, **kwargs):
+    # Автора и группу поста можно сменить в админке.
+    forget_post_page(instance.pk)
+    # Число постов автора выводится на страницах всех его постов.
+    author_ids = {
+        instance.author_id, getattr(instance, '_previous_author_id', None)
+    }
+    bump([
+        *post_namespaces(instance),
+        *(author_name_namespace(pk) for pk in author_ids - {None}),
+    ])
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_pages(sender, instance, **kwargs):
+    # Среди пространств страницы поста есть его комментаторы.
+    forget_post_page(instance.post_id)
+    bump([post_namespace(instance.post_id)])
+
+
+@receiver(post_save, sender=Group)
+def invalidate_group_pages(sender, instance, **kwargs):
+    # Ссылка на группу есть в карточках постов на главной и в профилях
+    # их авторов, а название — на страницах постов группы.
+    slugs = {instance.slug, getattr(instance, '_previous_slug', None)}
+    usernames = User.objects.filter(posts__group=instance).values_list(
+        'username', flat=True
+    ).distinct()
+    bump([
+        index_namespace(),
+        group_page_namespace(instance.pk),
+        *(group_namespace(slug) for slug in slugs - {None}),
+        *(author_namespace(username) for username in usernames),
+    ])
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_pages(sender, instance, created, update_fields,
+                            **kwargs):
+    """Сбрасывает страницы, где выводится имя автора.
+
+    Карточки постов сами получат новую версию, но страницы, в которые
+    они уже собраны, нужно пересобрать. Страницы всех постов автора и
+    постов с его комментариями сбрасываются одним пространством,
+    сколько бы их ни было.
+    """
+    if created or update_fields == frozenset({'last_login'}):
+        return
+    slugs = Group.objects.filter(posts__author=instance).values_list(
+        'slug', flat=True
+    ).distinct()
+    usernames = {
+        instance.username, getattr(instance, '_previous_username', None)
+    }
+    bump([
+        index_namespace(),
+        author_name_namespace(instance.pk),
+        *(author_namespace(username) for username in usernames - {None}),
+        *(group_namespace(slug) for slug in slugs),
+    ])
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_pages(sender, instance, **kwargs):
+    # Кнопка «Подписаться» на странице автора зависит от подписки.
+    bump([author_namespace(instance.author.username)])
@@ -0,0 +1,64 @@
+from django import template
+
+from posts import thumbnails
+from posts.cards import render_cards
+from posts.forms import CommentForm
+from posts.models import Follow
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def is_following(context, username):
+    """Подписан ли текущий пользователь на автора `username`."""
+    user = context['request'].user
+    return user.is_authenticated and Follow.objects.filter(
+        user=user, author__username=username
+    ).exists()
+
+
+@register.simple_tag
+def comment_form():
+    return CommentForm()
+
+
+@register.simple_tag
+def post_cards(posts, template_name='posts/includes/post_card.html',
+               **options):
+    """Карточки постов страницы, закешированные по отдельности.
+
+    Используется с `as`: `{% post_cards page_obj as cards %}`.
+    """
+    return render_cards(posts, template_name, **options)
+
+
+@register.simple_tag(takes_context=True)
+def thumbnail_url(context, post, kind):
+    """URL готовой миниатюры картинки поста вида `kind` или None.
+
+    Берётся из `post.thumbnail_urls`, если страница нашла миниатюры
+    заранее. Если миниатюры или WebP-вариантов ещё нет, картинка
+    ставится в очередь, а шаблон выводит то, что есть, или оригинал.
+    Карточка с такой картинкой не кешируется.
+    """
+    if not post.image:
+        return None
+    if not hasattr(post, 'thumbnail_urls'):
+        thumbnails.prefetch([post])
+    url = post.thumbnail_urls[kind]
+    if url is None or not post.image_srcsets[kind]:
+        thumbnails.schedule(post)
+        pending = context.get('pending_thumbnails')
+        if pending is not None:
+            pending.append(post.pk)
+    return url
+
+
+@register.simple_tag
+def image_srcset(post, kind):
+    """srcset WebP-вариантов картинки поста вида `kind`."""
+    if not post.image:
+        return ''
+    if not hasattr(post, 'image_srcsets'):
+        thumbnails.prefetch([post])
+    return post.image_srcsets[kind]
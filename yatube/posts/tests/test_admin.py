@@ -0,0 +1,78 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class AdminChangeListTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        Group.objects.create(title='Другая группа', slug='other')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.superuser)
+
+    def add_rows(self, count):
+        start = User.objects.count()
+        for number in range(start, start + count):
+            author = User.objects.create_user(username=f'user{number}')
+            post = Post.objects.create(
+                author=author, text=f'Пост {number}', group=self.group
+            )
+            Comment.objects.create(post=post, author=author, text='Текст')
+            Follow.objects.create(user=author, author=self.superuser)
+
+    def count_queries(self, name):
+        # Первый запрос прогревает сессию и оценки числа строк.
+        self.client.get(reverse(name))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(name))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_queries_do_not_grow_with_rows(self):
+        """Авторы, группы и выбор группы грузятся один раз на страницу."""
+        names = (
+            'admin:posts_post_changelist',
+            'admin:posts_comment_changelist',
+            'admin:posts_follow_changelist',
+        )
+        self.add_rows(1)
+        counts = {name: self.count_queries(name) for name in names}
+        self.add_rows(5)
+        for name in names:
+            with self.subTest(name=name):
+                self.assertEqual(self.count_queries(name), counts[name])
+
+    def test_date_hierarchy_filters_by_range(self):
+        post = Post.objects.create(author=self.superuser, text='Пост')
+        date = post.pub_date
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('admin:posts_post_changelist'),
+                {'pub_date__year': date.year, 'pub_date__month': date.month},
+            )
+        self.assertEqual(list(response.context['cl'].result_list), [post])
+        sql = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertIn('"posts_post"."pub_date" >= ', sql)
+        self.assertNotIn('django_datetime_extract', sql)
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=2)
+    def test_large_table_count_is_estimated(self):
+        self.add_rows(3)
+        url = reverse('admin:posts_post_changelist')
+        self.client.get(url)
+        Post.objects.create(author=self.superuser, text='Новый пост')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.context['cl'].result_count, 3)
+        sql = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertNotIn('COUNT(*)', sql)
@@ -0,0 +1,342 @@
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import garbage, thumbnails
+from posts.management.commands.benchmark_views import \
+    Command as BenchmarkCommand
+from posts.models import (AuthorCounters, Comment, Follow, Group, Post,
+                          StoredImage, TimelineEntry, User)
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+GC_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class SeedScaleTest(TestCase):
+    options = {
+        'seed': 7,
+        'users': 30,
+        'groups': 4,
+        'posts': 200,
+        'comments': 100,
+        'follows': 80,
+        'images': 0.2,
+        'batch_size': 50,
+    }
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def seed(self):
+        call_command('seed_scale', stdout=StringIO(), **self.options)
+
+    def snapshot(self):
+        return list(Post.objects.order_by('pk').values_list(
+            'author__username', 'group__slug', 'text', 'image',
+        ))
+
+    def test_volumes_and_derived_data(self):
+        self.seed()
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Group.objects.count(), 4)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 100)
+        self.assertTrue(Post.objects.exclude(image='').exists())
+        follow = Follow.objects.first()
+        self.assertEqual(
+            TimelineEntry.objects.filter(
+                user_id=follow.user_id, author_id=follow.author_id
+            ).count(),
+            Post.objects.filter(author_id=follow.author_id).count(),
+        )
+        busiest = AuthorCounters.objects.order_by('-posts').first()
+        self.assertEqual(
+            busiest.posts, Post.objects.filter(author=busiest.user).count()
+        )
+
+    def test_same_seed_gives_same_data(self):
+        self.seed()
+        first = self.snapshot()
+        for model in (Post, Group, User):
+            model.objects.all().delete()
+        self.seed()
+        self.assertEqual(self.snapshot(), first)
+
+    def test_empty_stages_are_skipped(self):
+        options = {**self.options, 'groups': 0, 'posts': 0, 'images': 0}
+        call_command('seed_scale', stdout=StringIO(), **options)
+        self.assertEqual(User.objects.count(), 30)
+        self.assertFalse(Post.objects.exists())
+        with self.assertRaises(CommandError):
+            call_command(
+                'seed_scale', stdout=StringIO(),
+                **{**self.options, 'seed': 8, 'users': 0},
+            )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BenchmarkViewsTest(TestCase):
+    def test_saves_and_compares_baselines(self):
+        call_command(
+            'seed_scale', stdout=StringIO(), users=10, groups=2, posts=30,
+            comments=10, follows=20, images=0,
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            paths = [os.path.join(directory, f'{name}.json')
+                     for name in ('old', 'new')]
+            for path in paths:
+                call_command(
+                    'benchmark_views', iterations=2, warmup=0, output=path,
+                    stdout=StringIO(),
+                )
+            with open(paths[0], encoding='utf-8') as baseline:
+                result = json.load(baseline)
+            out = StringIO()
+            call_command('benchmark_views', compare=paths, stdout=out)
+        self.assertEqual(
+            set(result['views']),
+            {'index', 'group_posts', 'profile', 'post_detail',
+             'follow_index'},
+        )
+        self.assertIn('p95_ms', result['views']['index'])
+        self.assertIn('follow_index  queries', out.getvalue())
+
+    def test_targets_busiest_group(self):
+        author = User.objects.create_user(username='author')
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=author)
+        busy, fresh = [
+            Group.objects.create(title=slug, slug=slug)
+            for slug in ('busy', 'fresh')
+        ]
+        for _ in range(3):
+            Post.objects.create(author=author, text='Пост', group=busy)
+        # В тихой группе самый свежий пост, но постов меньше.
+        Post.objects.create(author=author, text='Пост', group=fresh)
+        _, urls = BenchmarkCommand().targets()
+        self.assertEqual(
+            urls['group_posts'],
+            reverse('posts:group_list', kwargs={'slug': 'busy'}),
+        )
+
+
+@override_settings(MEDIA_ROOT=GC_MEDIA_ROOT)
+class CollectMediaTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(GC_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, content):
+        post = Post.objects.create(
+            author=User.objects.get_or_create(username='auth')[0],
+            text='Тестовый текст',
+            image=SimpleUploadedFile('small.gif', content, 'image/gif'),
+        )
+        thumbnails.generate(post)
+        return post
+
+    def write(self, name):
+        path = os.path.join(GC_MEDIA_ROOT, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as stray:
+            stray.write(SMALL_GIF)
+        return path
+
+    def collect(self, *args):
+        out = StringIO()
+        call_command('collect_media', *args, stdout=out)
+        return out.getvalue()
+
+    def test_removes_unreferenced_media(self):
+        kept = self.create_post(SMALL_GIF)
+        dropped = self.create_post(SMALL_GIF + b'\x00')
+        dropped_files = [dropped.image.path] + [
+            os.path.join(GC_MEDIA_ROOT, variant.name)
+            for variant in dropped.image_variants.all()
+        ]
+        dropped.delete()
+        strays = [
+            self.write('posts/image_07WaPP0.gif'),
+            self.write('cache/00/00/0000.jpg'),
+        ]
+        self.assertIn('Удалено оригиналов: 0, миниатюр: 0', self.collect())
+        self.assertIn(
+            'Можно удалить оригиналов: 2, миниатюр: 9',
+            self.collect('--grace=0', '--dry-run'),
+        )
+        for path in dropped_files + strays:
+            self.assertTrue(os.path.exists(path))
+        self.assertIn(
+            'Удалено оригиналов: 2, миниатюр: 9',
+            self.collect('--grace=0', '--batch-size=2'),
+        )
+        for path in dropped_files + strays:
+            self.assertFalse(os.path.exists(path))
+        self.assertTrue(os.path.exists(kept.image.path))
+        for kind in thumbnails.THUMBNAILS:
+            thumbnail = thumbnails.ready_thumbnail(kept.image, kind)
+            self.assertTrue(thumbnail.exists())
+        self.assertIn(
+            'Удалено оригиналов: 0, миниатюр: 0', self.collect('--grace=0')
+        )
+
+    def test_reuploaded_image_survives_collection(self):
+        """Загрузка, совпавшая со сборкой, не теряет файл."""
+        post = self.create_post(SMALL_GIF)
+        name = post.image.name
+        post.delete()
+        old = timezone.now() - timedelta(days=2)
+        os.utime(post.image.path, (old.timestamp(), old.timestamp()))
+        StoredImage.objects.filter(name=name).update(released=old)
+        collector = garbage.Collector(timedelta(days=1), batch_size=10)
+        # Та же картинка загружается, когда строку уже отпустили к
+        # удалению, а файл ещё на месте.
+        again = self.create_post(SMALL_GIF)
+        StoredImage.objects.filter(name=name).update(
+            refs=0, released=old
+        )
+        collector.released_images()
+        self.assertEqual(collector.originals, 0)
+        self.assertTrue(os.path.exists(again.image.path))
+
+
+class ImportContentTest(TestCase):
+    records = [
+        {'type': 'post', 'id': 500, 'author': 'leo', 'group': 'cats',
+         'text': 'Первый пост', 'pub_date': '2020-01-02T10:00:00'},
+        {'type': 'post', 'id': 501, 'author': 'leo', 'text': 'Второй пост'},
+        {'type': 'comment', 'post': 500, 'author': 'anna',
+         'text': 'Комментарий'},
+        {'type': 'follow', 'user': 'anna', 'author': 'leo'},
+        {'type': 'follow', 'user': 'leo', 'author': 'leo'},
+    ]
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_jsonl(self, records):
+        path = os.path.join(self.directory.name, 'content.jsonl')
+        with open(path, 'w', encoding='utf-8') as file:
+            for record in records:
+                file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        return path
+
+    def load(self, path, **options):
+        out = StringIO()
+        call_command(
+            'import_content', path, batch_size=2, stdout=out, **options
+        )
+        return out.getvalue()
+
+    def test_imports_content_and_derived_data(self):
+        out = self.load(self.write_jsonl(self.records))
+        self.assertIn('смещение: 5', out)
+        self.assertIn('строк/с', out)
+        leo = User.objects.get(username='leo')
+        post = Post.objects.get(pk=500)
+        self.assertEqual(post.author, leo)
+        self.assertEqual(post.group.slug, 'cats')
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(Comment.objects.get().author.username, 'anna')
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(AuthorCounters.objects.get(user=leo).posts, 2)
+        self.assertEqual(TimelineEntry.objects.filter(
+            user__username='anna', author=leo
+        ).count(), 2)
+
+    def test_resumes_from_offset(self):
+        # Первый запуск прервался после порции с постами.
+        self.load(self.write_jsonl(self.records[:2]))
+        self.load(self.write_jsonl(self.records), offset=2)
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_bad_rows_are_reported_with_number(self):
+        Post.objects.create(
+            author=User.objects.create_user(username='local'), pk=900,
+            text='Уже на сайте',
+        )
+        cases = [
+            ({'type': 'comment', 'author': 'anna', 'text': 'Без поста'},
+             'Строка 1: комментарий без post'),
+            ({'type': 'comment', 'post': 404, 'author': 'anna'},
+             'Строка 1: нет поста с id 404'),
+            ({'type': 'post', 'id': 900, 'author': 'leo'},
+             'Строка 1: пост с id 900 уже есть'),
+        ]
+        for record, message in cases:
+            with self.subTest(message=message):
+                path = self.write_jsonl([record])
+                with self.assertRaisesMessage(CommandError, message):
+                    self.load(path)
+        self.assertEqual(Post.objects.count(), 1)
+
+    def test_csv(self):
+        path = os.path.join(self.directory.name, 'content.csv')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(
+                'type,id,author,group,text,post,user\n'
+                'post,7,leo,,Пост из CSV,,\n'
+                'comment,,anna,,Ответ,7,\n'
+            )
+        self.load(path)
+        post = Post.objects.get(pk=7)
+        self.assertIsNone(post.group)
+        self.assertEqual(post.comments.get().text, 'Ответ')
+
+
+class ExportUserDataTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_export_can_be_imported_back(self):
+        user = User.objects.create_user(username='leo')
+        post = Post.objects.create(author=user, text='Пост')
+        Comment.objects.create(post=post, author=user, text='Комментарий')
+        path = os.path.join(self.directory.name, 'leo.zip')
+        out = StringIO()
+        call_command('export_user_data', 'leo', output=path, stdout=out)
+        self.assertIn(f'Архив {path}', out.getvalue())
+        with zipfile.ZipFile(path) as archive:
+            archive.extractall(self.directory.name)
+        Post.objects.all().delete()
+        for name in ('posts.jsonl', 'comments.jsonl'):
+            call_command(
+                'import_content', os.path.join(self.directory.name, name),
+                stdout=StringIO(),
+            )
+        post = Post.objects.get(pk=post.pk)
+        self.assertEqual(post.text, 'Пост')
+        self.assertEqual(post.comments.get().text, 'Комментарий')
@@ -85,6 +85,17 @@ class PostFormTests(TestCase):
         self.assertEqual(post.text, self.post.text)
         self.assertTrue(Post.objects.filter(id=1).exists())
 
+    def test_edit_keeps_comments_added_meanwhile(self):
+        """Сохранение поста не затирает счётчик комментариев."""
+        # Пост загружен до комментария, как в начале запроса на правку.
+        stale = Post.objects.get(pk=self.post.pk)
+        Comment.objects.create(post=self.post, author=self.user, text='К')
+        stale.text = 'Новый текст'
+        stale.save()
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.text, 'Новый текст')
+        self.assertEqual(post.comment_count, 1)
+
     def test_guest_user_post_edit(self):
         """Отправка формы редактирования неавторизованным пользователем
         не меняет данные в базе."""
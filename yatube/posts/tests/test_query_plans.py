@@ -0,0 +1,111 @@
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, PopularAuthor, Post, User
+
+
+def query_plan(sql, params=()):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def bad_plan_steps(plan):
+    """Шаги плана с полным обходом таблицы или сортировкой во B-дереве."""
+    return [
+        step for step in plan
+        if 'TEMP B-TREE' in step
+        or (step.startswith('SCAN') and 'INDEX' not in step)
+    ]
+
+
+class FeedQueryPlanTest(TestCase):
+    """Запросы лент идут по индексам, без полных обходов и сортировок."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.star = User.objects.create_user(username='star')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Follow.objects.create(user=cls.reader, author=cls.star)
+        PopularAuthor.objects.create(author=cls.star)
+        for number in range(15):
+            for author in (cls.author, cls.star):
+                post = Post.objects.create(
+                    author=author, text=f'Пост {number}', group=cls.group
+                )
+        Comment.objects.create(post=post, author=cls.reader, text='Да')
+        cls.post = post
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def assert_plans_use_indexes(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        page_obj = response.context.get('page_obj')
+        urls = [url]
+        if page_obj is not None and page_obj.paginator.next_cursor:
+            # Страница после курсора выбирается другим условием.
+            urls.append(f'{url}?after={page_obj.paginator.next_cursor}')
+            cache.clear()
+            with CaptureQueriesContext(connection) as next_queries:
+                self.client.get(urls[-1])
+            queries.captured_queries.extend(next_queries.captured_queries)
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT'):
+                continue
+            plan = query_plan(sql)
+            with self.subTest(url=url, sql=sql):
+                self.assertEqual(bad_plan_steps(plan), [], plan)
+
+    def test_feed_views_use_indexes(self):
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:follow_index'),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        ]
+        for url in urls:
+            self.assert_plans_use_indexes(url)
+
+    def test_follow_lookup_uses_unique_index(self):
+        sql = str(
+            Follow.objects.filter(user=self.reader, author=self.author).query
+        )
+        plan = query_plan(sql)
+        self.assertTrue(
+            any('(user_id=? AND author_id=?)' in step for step in plan), plan
+        )
+
+    def test_image_refs_use_index(self):
+        """Ссылки на картинки порции считаются по индексу, без обхода
+        всех постов."""
+        names = ['posts/a.gif', 'posts/b.gif']
+        querysets = [
+            Post.objects.filter(image__in=names).order_by().values(
+                'image'
+            ).annotate(total=Count('pk')).values_list('image', 'total'),
+            Post.objects.filter(image__in=names).order_by().values_list(
+                'image', flat=True
+            ),
+        ]
+        for queryset in querysets:
+            plan = query_plan(*queryset.query.sql_with_params())
+            with self.subTest(plan=plan):
+                self.assertEqual(bad_plan_steps(plan), [], plan)
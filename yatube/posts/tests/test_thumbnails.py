@@ -0,0 +1,248 @@
+import io
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts import thumbnails
+from posts.cards import card_key
+from posts.models import Post, StoredImage, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=self.user,
+            text='Тестовый текст',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+
+    def card_is_cached(self):
+        key = card_key(
+            Post.objects.for_feed().get(pk=self.post.pk),
+            'posts/includes/post_card.html', {},
+        )
+        return cache.get(key) is not None
+
+    def test_pending_thumbnail_falls_back_to_original(self):
+        """Пока миниатюры нет, выводится оригинал, карточка не кешируется."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, self.post.image.url)
+        self.assertFalse(self.card_is_cached())
+
+    def test_ready_thumbnail_is_shown_and_cached(self):
+        thumbnails.generate(self.post)
+        for kind in thumbnails.THUMBNAILS:
+            self.assertIsNotNone(
+                thumbnails.ready_thumbnail(self.post.image, kind)
+            )
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, self.post.image.url)
+        self.assertContains(
+            response,
+            thumbnails.ready_thumbnail(self.post.image, 'padding').url,
+        )
+        self.assertTrue(self.card_is_cached())
+
+    def test_page_thumbnails_are_read_at_once(self):
+        """Миниатюры и варианты всей страницы читаются двумя запросами."""
+        posts = [self.post] + [
+            Post.objects.create(
+                author=self.user,
+                text='Ещё пост',
+                image=SimpleUploadedFile(
+                    'small.gif', SMALL_GIF + bytes([number]), 'image/gif'
+                ),
+            )
+            for number in range(3)
+        ]
+        for post in posts[:2]:
+            thumbnails.generate(post)
+        cache.clear()
+        with self.assertNumQueries(2):
+            thumbnails.prefetch(posts)
+        for post in posts[:2]:
+            self.assertEqual(
+                post.thumbnail_urls['crop'],
+                thumbnails.ready_thumbnail(post.image, 'crop').url,
+            )
+        for post in posts[2:]:
+            self.assertEqual(
+                post.thumbnail_urls, {'padding': None, 'crop': None}
+            )
+        for post in posts[2:]:
+            self.assertEqual(
+                post.image_srcsets, {'padding': '', 'crop': ''}
+            )
+        # Отсутствие миниатюр тоже закешировано.
+        with self.assertNumQueries(1):
+            thumbnails.prefetch(posts)
+
+    def test_webp_variants_are_recorded_and_shown(self):
+        thumbnails.generate(self.post)
+        variants = self.post.image_variants.order_by('kind', 'width')
+        self.assertEqual(
+            [(variant.kind, variant.width) for variant in variants],
+            [
+                (kind, width)
+                for kind in sorted(thumbnails.THUMBNAILS)
+                for width in settings.POST_IMAGE_WIDTHS
+            ],
+        )
+        for variant in variants:
+            self.assertTrue(variant.name.endswith('.webp'))
+            self.assertEqual(variant.source, self.post.image.name)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'type="image/webp"')
+        for variant in variants.filter(kind='padding'):
+            self.assertContains(
+                response,
+                f'{settings.MEDIA_URL}{variant.name} {variant.width}w',
+            )
+
+    def test_replaced_image_variants_are_not_shown(self):
+        thumbnails.generate(self.post)
+        self.post.image = SimpleUploadedFile(
+            'other.gif', SMALL_GIF + b'\x00', 'image/gif'
+        )
+        self.post.save()
+        post = Post.objects.get(pk=self.post.pk)
+        thumbnails.prefetch([post])
+        self.assertEqual(post.image_srcsets, {'padding': '', 'crop': ''})
+
+    def test_save_queues_generation_once(self):
+        """Сохранение поста ставит картинку в очередь после коммита."""
+        executor = mock.Mock()
+        in_background = mock.patch.object(
+            thumbnails, '_in_background', lambda: True
+        )
+        with mock.patch.object(transaction, 'on_commit', lambda f: f()), \
+                in_background, \
+                mock.patch.object(thumbnails, '_executor', executor):
+            self.post.save()
+            self.post.save()
+        executor.submit.assert_called_once_with(
+            thumbnails._generate_in_worker,
+            self.post.image.name,
+            self.post.pk,
+        )
+
+    def test_broken_image_is_not_retried_on_every_view(self):
+        """Битая картинка не готовится заново при каждом показе
+        страницы и не сбрасывает кеш лент."""
+        self.post.delete()
+        Post.objects.create(
+            author=self.user,
+            text='Битая картинка',
+            image=SimpleUploadedFile('broken.gif', b'GIF89a', 'image/gif'),
+        )
+        generate = mock.patch.object(
+            thumbnails, 'generate', wraps=thumbnails.generate
+        )
+        with mock.patch.object(transaction, 'on_commit', lambda f: f()), \
+                mock.patch.object(thumbnails, 'bump') as bump, \
+                generate as generate, self.assertLogs(level='ERROR'):
+            for _ in range(3):
+                response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Битая картинка')
+        generate.assert_called_once()
+        bump.assert_not_called()
+
+    def test_in_memory_database_generates_in_place(self):
+        """С базой в памяти миниатюры готовятся без фоновых потоков."""
+        with mock.patch.object(transaction, 'on_commit', lambda f: f()):
+            self.post.save()
+        self.assertIsNotNone(
+            thumbnails.ready_thumbnail(self.post.image, 'crop')
+        )
+        self.assertTrue(self.post.image_variants.exists())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class StoredImageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, content=SMALL_GIF, filename='small.gif'):
+        return Post.objects.create(
+            author=self.user,
+            text='Тестовый текст',
+            image=SimpleUploadedFile(filename, content, 'image/gif'),
+        )
+
+    def refs(self, name):
+        return StoredImage.objects.get(name=name).refs
+
+    def test_same_upload_is_shared(self):
+        """Одинаковые картинки делят файл и миниатюры."""
+        first = self.create_post()
+        second = self.create_post(filename='copy.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(self.refs(first.image.name), 2)
+        thumbnails.generate(first)
+        self.assertIsNotNone(thumbnails.ready_thumbnail(second.image, 'crop'))
+
+    def test_refs_follow_replace_and_delete(self):
+        post = self.create_post()
+        other = self.create_post()
+        name = post.image.name
+        post.image = SimpleUploadedFile(
+            'other.gif', SMALL_GIF + b'\x00', 'image/gif'
+        )
+        post.save()
+        self.assertEqual(self.refs(name), 1)
+        self.assertEqual(self.refs(post.image.name), 1)
+        other.delete()
+        released = StoredImage.objects.get(name=name)
+        self.assertEqual(released.refs, 0)
+        self.assertIsNotNone(released.released)
+        self.create_post()
+        self.assertIsNone(StoredImage.objects.get(name=name).released)
+
+    def test_reconcile_fixes_image_refs(self):
+        post = self.create_post()
+        name = post.image.name
+        StoredImage.objects.filter(name=name).update(refs=5)
+        StoredImage.objects.create(name='posts/aa/gone.gif', refs=1)
+        call_command('reconcile_counters', stdout=io.StringIO())
+        self.assertEqual(self.refs(name), 1)
+        gone = StoredImage.objects.get(name='posts/aa/gone.gif')
+        self.assertEqual(gone.refs, 0)
+        self.assertIsNotNone(gone.released)
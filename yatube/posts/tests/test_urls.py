@@ -29,6 +29,7 @@ class StatusURLTests(TestCase):
             f'/posts/{self.post.id}/edit/': 'posts/create_post.html',
             '/create/': 'posts/create_post.html',
             f'/profile/{self.user}/': 'posts/profile.html',
+            '/search/?q=тест': 'posts/search.html',
             '/about/author/': 'about/author.html',
             '/about/tech/': 'about/tech.html',
         }
@@ -37,6 +38,7 @@ class StatusURLTests(TestCase):
             f'/group/{self.group.slug}/',
             f'/posts/{self.post.id}/',
             f'/profile/{self.user}/',
+            '/search/?q=тест',
             '/about/author/',
             '/about/tech/',
         ]
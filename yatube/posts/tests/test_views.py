@@ -1,12 +1,28 @@
+import base64
+import json
+import os
+import shutil
+import tempfile
+import zipfile
 from http import HTTPStatus
+from io import BytesIO, StringIO
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.core.cache import cache
-from django.test import Client, TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from posts.models import Follow, Group, Post, User
+from posts import export, search
+from posts.cache import author_namespace, bump
+from posts.counters import author_counters
+from posts.models import (AuthorCounters, Comment, Follow, Group,
+                          PopularAuthor, Post, TimelineEntry, User)
 
 
 class PostPagesTest(TestCase):
@@ -59,6 +75,11 @@ class PostPagesTest(TestCase):
         self.authorized_client2.force_login(self.user1)
         cache.clear()
 
+    def get_uncached(self, client, url):
+        # Страницы кешируются одни на всех пользователей.
+        cache.clear()
+        return client.get(url)
+
     def test_pages_uses_correct_template(self):
         """URL-адрес использует соответствующий шаблон."""
         for reverse_name, template in self.templates_pages_names.items():
@@ -84,20 +105,24 @@ class PostPagesTest(TestCase):
         """Шаблоны index (при запросе неавторизованного пользователя),
         group_list, profile сформированы с правильным контекстом."""
         responses = [
-            self.guest_client.get(reverse('posts:index')),
-            self.authorized_client.get(
+            self.get_uncached(self.guest_client, reverse('posts:index')),
+            self.get_uncached(
+                self.authorized_client,
                 reverse('posts:group_list',
                         kwargs={'slug': 'test-slug'})
             ),
-            self.guest_client.get(
+            self.get_uncached(
+                self.guest_client,
                 reverse('posts:group_list',
                         kwargs={'slug': 'test-slug'})
             ),
-            self.authorized_client.get(
+            self.get_uncached(
+                self.authorized_client,
                 reverse('posts:profile',
                         kwargs={'username': 'auth'})
             ),
-            self.guest_client.get(
+            self.get_uncached(
+                self.guest_client,
                 reverse('posts:profile',
                         kwargs={'username': 'auth'})
             ),
@@ -117,12 +142,12 @@ class PostPagesTest(TestCase):
     def test_post_detail_pages_show_correct_context(self):
         """Шаблон post_detail сформирован с правильным контекстом."""
         responses = [
-            self.guest_client.
-            get(
+            self.get_uncached(
+                self.guest_client,
                 reverse('posts:post_detail', kwargs={'post_id': self.post.id})
             ),
-            self.authorized_client.
-            get(
+            self.get_uncached(
+                self.authorized_client,
                 reverse('posts:post_detail', kwargs={'post_id': self.post.id})
             )
         ]
@@ -201,14 +226,64 @@ class PostPagesTest(TestCase):
     def test_index_page_cache_correct(self):
         """Кеш главной страницы работает правильно."""
         response = self.authorized_client.get(reverse('posts:index'))
-        temp_post = Post.objects.get(id=1)
-        temp_post.delete()
+        # update() не шлёт сигналов, поэтому кеш остаётся прежним.
+        Post.objects.filter(id=1).update(text='Изменённый текст')
         new_response = self.authorized_client.get(reverse('posts:index'))
         self.assertEqual(response.content, new_response.content)
         cache.clear()
         new_new_response = self.authorized_client.get(reverse('posts:index'))
         self.assertNotEqual(response.content, new_new_response.content)
 
+    def test_cached_page_is_personalized(self):
+        """Общая закешированная страница дорисовывается под пользователя."""
+        url = reverse('posts:profile', kwargs={'username': 'auth'})
+        self.authorized_client.get(url)
+        response = self.authorized_client1.get(url)
+        self.assertTemplateNotUsed(response, 'posts/profile.html')
+        self.assertContains(response, 'Пользователь: follower')
+        self.assertNotContains(response, 'Пользователь: author')
+        self.assertContains(response, 'Подписаться')
+        self.assertNotContains(response, '<!--hole:')
+        response = self.guest_client.get(url)
+        self.assertContains(response, 'Войти')
+        author_client = Client()
+        author_client.force_login(self.post.author)
+        response = author_client.get(url)
+        self.assertNotContains(response, 'Подписаться')
+
+    def test_post_delete_invalidates_cached_pages(self):
+        """Удаление поста сразу сбрасывает кеш главной, группы и профиля."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'auth'}),
+        ]
+        responses = [self.guest_client.get(url) for url in urls]
+        Post.objects.get(id=1).delete()
+        for url, response in zip(urls, responses):
+            with self.subTest(url=url):
+                new_response = self.guest_client.get(url)
+                self.assertNotEqual(response.content, new_response.content)
+
+    def test_new_post_keeps_other_groups_cached(self):
+        """Новый пост сбрасывает кеш только своей группы."""
+        other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Тестовое описание',
+        )
+        url = reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+        other_url = reverse('posts:group_list', kwargs={'slug': 'other-slug'})
+        self.guest_client.get(url)
+        self.guest_client.get(other_url)
+        Post.objects.create(author=self.user, text='Новый', group=other_group)
+        self.assertTemplateNotUsed(
+            self.guest_client.get(url), 'posts/group_list.html'
+        )
+        self.assertTemplateUsed(
+            self.guest_client.get(other_url), 'posts/group_list.html'
+        )
+
     def test_authorized_user_can_follow_unfollow(self):
         """Авторизованный пользователь может подписываться на других
         пользователей и удалять их из подписок."""
@@ -288,11 +363,634 @@ class PaginatorViewsTest(TestCase):
     def test_second_index_group_list_profile_page_contains_three_records(self):
         """Проверка паджинатора второй страницы index, group_list, profile."""
         paginator_responses = [
-            self.client.get(reverse('posts:index') + '?page=2'),
+            self.client.get(reverse('posts:index') + '?page=2',
+                            follow=True),
             self.client.get(reverse('posts:group_list',
-                                    kwargs={'slug': 'test-slug'}) + '?page=2'),
+                                    kwargs={'slug': 'test-slug'}) + '?page=2',
+                            follow=True),
             self.client.get(reverse('posts:profile',
-                                    kwargs={'username': 'auth'}) + '?page=2'),
+                                    kwargs={'username': 'auth'}) + '?page=2',
+                            follow=True),
         ]
         for response in paginator_responses:
             self.assertEqual(len(response.context['page_obj']), 3)
+
+    def test_cursor_links_walk_whole_feed(self):
+        """Курсоры next/previous обходят ленту без пропусков и повторов."""
+        url = reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+        first_page = self.client.get(url).context['page_obj']
+        next_cursor = first_page.paginator.next_cursor
+        second_page = self.client.get(
+            url, {'after': next_cursor}
+        ).context['page_obj']
+        self.assertFalse(second_page.has_next())
+        self.assertTrue(second_page.has_previous())
+        seen = [post.pk for post in first_page] + [
+            post.pk for post in second_page
+        ]
+        self.assertEqual(
+            seen,
+            list(Post.objects.order_by('-pub_date', '-pk')
+                 .values_list('pk', flat=True)),
+        )
+        back_page = self.client.get(
+            url, {'before': second_page.paginator.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(back_page), list(first_page))
+        self.assertFalse(back_page.has_previous())
+
+    def test_legacy_page_parameter_redirects_to_cursor(self):
+        """Старые ссылки ?page=N переадресуются на курсорные."""
+        url = reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+        response = self.client.get(url + '?page=2')
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.assertIn('after=', response.url)
+        response = self.client.get(url + '?page=1')
+        self.assertRedirects(response, url)
+
+    def test_broken_cursor_shows_first_page(self):
+        """Битый курсор не ломает страницу, а показывает начало ленты."""
+        url = reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+        # Эти токены правильно упакованы, но дата в первом не дата, а
+        # id во втором не помещается в целое SQLite.
+        tampered = [
+            base64.urlsafe_b64encode(raw).decode().rstrip('=')
+            for raw in (b'foo|1', b'2020-01-01T00:00:00|' + b'9' * 30)
+        ]
+        for token in ('not-a-cursor', *tampered):
+            for param in ('after', 'before'):
+                with self.subTest(token=token, param=param):
+                    response = self.client.get(url, {param: token})
+                    self.assertEqual(response.status_code, HTTPStatus.OK)
+                    self.assertEqual(len(response.context['page_obj']),
+                                     settings.ARTICLES_SELECTION)
+        response = self.client.get(url, {'page': '9' * 30})
+        self.assertRedirects(response, url)
+        response = self.client.get(
+            reverse('posts:search'),
+            {'q': 'Тестовый', 'after': tampered[1]},
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Тестовый текст',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_warm_profile_does_not_count(self):
+        """Прогретый профиль не выполняет COUNT(*)."""
+        url = reverse('posts:profile', kwargs={'username': 'auth'})
+        self.client.get(url)
+        bump([author_namespace('auth')])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.context['post_number'], 1)
+        for query in queries.captured_queries:
+            self.assertNotIn('COUNT(', query['sql'])
+
+    def test_counter_follows_created_and_deleted_posts(self):
+        """Счётчик постов сдвигается при создании и удалении."""
+        url = reverse('posts:profile', kwargs={'username': 'auth'})
+        self.client.get(url)
+        post = Post.objects.create(author=self.user, text='Ещё пост')
+        response = self.client.get(url)
+        self.assertEqual(response.context['post_number'], 2)
+        post.delete()
+        response = self.client.get(url)
+        self.assertEqual(response.context['post_number'], 1)
+
+    def test_author_change_moves_counter_and_timeline(self):
+        """Смена автора поста переносит счётчик и строки лент."""
+        other = User.objects.create_user(username='other')
+        old_reader = User.objects.create_user(username='old_reader')
+        new_reader = User.objects.create_user(username='new_reader')
+        Follow.objects.create(user=old_reader, author=self.user)
+        Follow.objects.create(user=new_reader, author=other)
+        url = reverse('posts:profile', kwargs={'username': 'auth'})
+        self.client.get(url)
+        self.post.author = other
+        self.post.save()
+        self.assertEqual(author_counters(self.user).posts, 0)
+        self.assertEqual(author_counters(other).posts, 1)
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(post=self.post).values_list(
+                'user', 'author'
+            )),
+            [(new_reader.pk, other.pk)],
+        )
+        self.assertEqual(self.client.get(url).context['post_number'], 0)
+
+    def test_follow_counters(self):
+        """Подписка и отписка меняют счётчики обоих пользователей."""
+        reader = User.objects.create_user(username='reader')
+        self.client.force_login(reader)
+        self.client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'auth'})
+        )
+        self.assertEqual(author_counters(self.user).followers, 1)
+        self.assertEqual(author_counters(reader).following, 1)
+        self.client.get(
+            reverse('posts:profile_unfollow', kwargs={'username': 'auth'})
+        )
+        self.user.refresh_from_db()
+        reader.refresh_from_db()
+        self.assertEqual(author_counters(self.user).followers, 0)
+        self.assertEqual(author_counters(reader).following, 0)
+
+    def test_comment_counter(self):
+        """Комментарий увеличивает счётчик поста, удаление уменьшает."""
+        self.client.force_login(self.user)
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Комментарий'},
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        self.post.comments.get().delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+
+    def test_reconcile_counters_fixes_drift(self):
+        """Команда reconcile_counters исправляет разошедшиеся счётчики."""
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=self.user)
+        Comment.objects.create(post=self.post, author=reader, text='Да')
+        AuthorCounters.objects.filter(user=self.user).update(
+            posts=10, followers=0
+        )
+        AuthorCounters.objects.filter(user=reader).delete()
+        Post.objects.filter(pk=self.post.pk).update(comment_count=5)
+        call_command('reconcile_counters', chunk_size=1, stdout=StringIO())
+        self.assertEqual(
+            AuthorCounters.objects.filter(user=self.user).values_list(
+                'posts', 'followers', 'following'
+            ).get(),
+            (1, 1, 0),
+        )
+        self.assertEqual(
+            AuthorCounters.objects.filter(user=reader).values_list(
+                'posts', 'followers', 'following'
+            ).get(),
+            (0, 0, 1),
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+
+
+class FollowTimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def feed(self, **params):
+        response = self.reader_client.get(
+            reverse('posts:follow_index'), params
+        )
+        return response.context['page_obj']
+
+    def test_posts_are_fanned_out_and_backfilled(self):
+        """Лента подписок заполняется при записи и при подписке."""
+        old_post = Post.objects.create(author=self.author, text='Старый')
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(user=self.reader)
+                .values_list('post_id', flat=True)),
+            {old_post.pk, new_post.pk},
+        )
+        self.assertEqual(list(self.feed()), [new_post, old_post])
+
+    def test_unfollow_prunes_timeline(self):
+        """После отписки посты автора пропадают из ленты."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.create(author=self.author, text='Текст')
+        self.reader_client.get(
+            reverse('posts:profile_unfollow',
+                    kwargs={'username': self.author.username})
+        )
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader))
+        self.assertEqual(len(self.feed()), 0)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0, ARTICLES_SELECTION=2)
+    def test_popular_author_is_merged_on_read(self):
+        """Посты популярного автора подмешиваются в ленту при чтении."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        regular = User.objects.create_user(username='regular')
+        Post.objects.create(author=regular, text='До подписки')
+        Follow.objects.create(user=self.reader, author=regular)
+        posts = [
+            Post.objects.create(author=author, text=str(number))
+            for number, author in enumerate(
+                [self.author, regular, self.author]
+            )
+        ]
+        self.assertTrue(PopularAuthor.objects.filter(author=self.author))
+        self.assertFalse(
+            TimelineEntry.objects.filter(author=self.author).exists()
+        )
+        first_page = self.feed()
+        self.assertEqual(list(first_page), posts[::-1][:2])
+        second_page = self.feed(after=first_page.paginator.next_cursor)
+        self.assertEqual(len(second_page), 2)
+        self.assertEqual(second_page[0], posts[0])
+
+    @override_settings(ARTICLES_SELECTION=4)
+    def test_other_followers_do_not_duplicate_posts(self):
+        """Строки лент других подписчиков не дублируют посты."""
+        for number in range(5):
+            follower = User.objects.create_user(username=f'follower{number}')
+            Follow.objects.create(user=follower, author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = [
+            Post.objects.create(author=self.author, text=str(number))
+            for number in range(10)
+        ]
+        seen = []
+        page = self.feed()
+        while True:
+            seen.extend(page)
+            cursor = page.paginator.next_cursor
+            if cursor is None:
+                break
+            page = self.feed(after=cursor)
+        self.assertEqual(seen, posts[::-1])
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой'
+        )
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=self.author, text='Тестовый текст', group=self.group
+        )
+        self.client = Client()
+
+    def test_cards_are_shared_between_feeds(self):
+        """Карточка, собранная для главной, берётся из кеша в подписках."""
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=self.author)
+        self.client.get(reverse('posts:index'))
+        self.client.force_login(reader)
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertTemplateUsed(response, 'posts/follow.html')
+        self.assertTemplateNotUsed(response, 'posts/includes/post_card.html')
+        self.assertContains(response, 'Тестовый текст')
+
+    def test_post_edit_renders_new_card(self):
+        """Правка поста даёт новую карточку."""
+        self.client.get(reverse('posts:index'))
+        self.post.text = 'Новый текст'
+        self.post.save()
+        response = self.client.get(reverse('posts:index'))
+        self.assertTemplateUsed(response, 'posts/includes/post_card.html')
+        self.assertContains(response, 'Новый текст')
+        self.assertNotContains(response, 'Тестовый текст')
+
+    def test_group_change_renders_new_card(self):
+        """Смена слага группы меняет ссылку в карточке."""
+        self.client.get(reverse('posts:index'))
+        self.group.slug = 'new-slug'
+        self.group.save()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(
+            response, reverse('posts:group_list', kwargs={'slug': 'new-slug'})
+        )
+
+    def test_author_rename_renders_new_card(self):
+        """Смена имени автора видна во всех лентах с его постами."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        ]
+        for url in urls:
+            self.client.get(url)
+        self.author.first_name = 'Алексей'
+        self.author.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, 'Алексей Толстой')
+                self.assertNotContains(response, 'Лев Толстой')
+
+    def test_new_post_updates_author_post_count(self):
+        """Новый и удалённый пост меняют число постов на страницах
+        других постов автора."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.client.get(url)
+        other = Post.objects.create(author=self.author, text='Второй')
+        response = self.client.get(url)
+        self.assertEqual(response.context['post_number'], 2)
+        other.delete()
+        response = self.client.get(url)
+        self.assertEqual(response.context['post_number'], 1)
+
+    def test_group_rename_updates_post_page(self):
+        """Новое название группы видно на страницах её постов."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.client.get(url)
+        self.group.title = 'Новое название'
+        self.group.save()
+        self.assertContains(self.client.get(url), 'Новое название')
+
+    def test_renames_drop_pages_under_old_names(self):
+        """После переименования страницы под старым именем и слагом
+        больше не отдаются из кеша."""
+        profile = reverse('posts:profile', kwargs={'username': 'author'})
+        group = reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+        self.client.get(profile)
+        self.client.get(group)
+        self.author.username = 'writer'
+        self.author.save()
+        self.group.slug = 'new-slug'
+        self.group.save()
+        self.assertEqual(
+            self.client.get(profile).status_code, HTTPStatus.NOT_FOUND
+        )
+        self.assertEqual(
+            self.client.get(group).status_code, HTTPStatus.NOT_FOUND
+        )
+
+    def test_group_slug_change_updates_profile(self):
+        """Новый слаг группы виден в профилях авторов её постов."""
+        url = reverse('posts:profile', kwargs={'username': 'author'})
+        self.client.get(url)
+        self.group.slug = 'new-slug'
+        self.group.save()
+        self.assertContains(
+            self.client.get(url),
+            reverse('posts:group_list', kwargs={'slug': 'new-slug'}),
+        )
+
+    def test_commenter_rename_updates_post_page(self):
+        """Новое имя комментатора видно на странице поста."""
+        commenter = User.objects.create_user(username='commenter')
+        Comment.objects.create(
+            post=self.post, author=commenter, text='Комментарий'
+        )
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.client.get(url)
+        commenter.username = 'reviewer'
+        commenter.save()
+        response = self.client.get(url)
+        self.assertContains(response, 'reviewer')
+        self.assertNotContains(response, 'commenter')
+
+    def test_author_save_bumps_fixed_namespaces(self):
+        """Число сбрасываемых пространств не растёт с числом постов."""
+        Post.objects.bulk_create([
+            Post(author=self.author, text=f'Пост {number}')
+            for number in range(20)
+        ])
+        with mock.patch('posts.signals.bump') as bump:
+            self.author.save()
+        namespaces = bump.call_args[0][0]
+        self.assertEqual(len(namespaces), 4)
+
+    def test_login_keeps_pages_cached(self):
+        """Вход автора обновляет last_login, но кеш страниц не сбрасывает."""
+        self.client.get(reverse('posts:index'))
+        self.client.force_login(self.author)
+        response = self.client.get(reverse('posts:index'))
+        self.assertTemplateNotUsed(response, 'posts/index.html')
+
+
+class FeedQueryCountTest(TestCase):
+    """Число запросов страницы не зависит от числа постов на ней."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def add_posts(self, count):
+        for _ in range(count):
+            number = User.objects.count()
+            author = User.objects.create_user(username=f'author{number}')
+            Follow.objects.create(user=self.reader, author=author)
+            post = Post.objects.create(
+                author=author, text=f'Пост {number}', group=self.group
+            )
+            Comment.objects.create(post=post, author=author, text='Да')
+        return post
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        return len(queries)
+
+    def test_feed_pages_use_constant_queries(self):
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:follow_index'),
+        ]
+        self.add_posts(1)
+        counts = [self.count_queries(url) for url in urls]
+        self.add_posts(settings.ARTICLES_SELECTION)
+        for url, count in zip(urls, counts):
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), count)
+
+    def test_profile_and_detail_use_constant_queries(self):
+        author = User.objects.create_user(username='author')
+        post = Post.objects.create(author=author, text='Пост')
+        urls = [
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+        ]
+        Comment.objects.create(post=post, author=self.reader, text='Да')
+        counts = [self.count_queries(url) for url in urls]
+        for number in range(settings.ARTICLES_SELECTION):
+            Post.objects.create(author=author, text=f'Пост {number}')
+            commenter = User.objects.create_user(username=f'user{number}')
+            Comment.objects.create(post=post, author=commenter, text='Да')
+        for url, count in zip(urls, counts):
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), count)
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.superuser = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        Post.objects.bulk_create([
+            Post(author=cls.user, text='Котики спят на диване'),
+            Post(author=cls.user, text='Ёжик в тумане'),
+            Post(author=cls.user, text='Котик, котик и ещё котик'),
+            Post(author=cls.user, text='Про собак'),
+        ])
+
+    def search(self, query, **params):
+        response = self.client.get(
+            reverse('posts:search'), {'q': query, **params}
+        )
+        return [post.text for post in response.context['page_obj']]
+
+    def test_words_forms_and_yo_are_found(self):
+        """Находятся другие формы слова и «ё» через «е»."""
+        self.assertEqual(
+            sorted(self.search('котики')),
+            ['Котик, котик и ещё котик', 'Котики спят на диване'],
+        )
+        self.assertEqual(self.search('ежики'), ['Ёжик в тумане'])
+        self.assertEqual(self.search('СОБАКИ'), ['Про собак'])
+        self.assertEqual(self.search('котик слон'), [])
+
+    def test_fts_syntax_is_escaped(self):
+        for query in ('"', 'NEAR(', 'кот*)', 'text:кот', '-'):
+            with self.subTest(query=query):
+                response = self.client.get(
+                    reverse('posts:search'), {'q': query}
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_results_are_ranked_and_paged_by_cursor(self):
+        Post.objects.bulk_create([
+            Post(author=self.user, text=f'Кот номер {number}')
+            for number in range(settings.ARTICLES_SELECTION + 2)
+        ])
+        response = self.client.get(reverse('posts:search'), {'q': 'кот'})
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj[0].text, 'Котик, котик и ещё котик')
+        cursor = page_obj.paginator.next_cursor
+        self.assertContains(
+            response, f'q=%D0%BA%D0%BE%D1%82&amp;after={cursor}'
+        )
+        first = [post.text for post in page_obj]
+        response = self.client.get(
+            reverse('posts:search'), {'q': 'кот', 'after': cursor}
+        )
+        page_obj = response.context['page_obj']
+        rest = [post.text for post in page_obj]
+        self.assertEqual(
+            len(first) + len(rest), settings.ARTICLES_SELECTION + 4
+        )
+        self.assertFalse(set(first) & set(rest))
+        self.assertEqual(self.search(
+            'кот', before=page_obj.paginator.previous_cursor
+        ), first)
+
+    def test_index_follows_edits_and_deletes(self):
+        post = Post.objects.get(text='Про собак')
+        post.text = 'Про слонов'
+        post.save()
+        self.assertEqual(self.search('собака'), [])
+        self.assertEqual(self.search('слоны'), ['Про слонов'])
+        post.delete()
+        self.assertEqual(self.search('слоны'), [])
+
+    def test_admin_uses_index(self):
+        self.client.force_login(self.superuser)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('admin:posts_post_changelist'), {'q': 'котик'}
+            )
+        self.assertEqual(response.context['cl'].result_count, 2)
+        sql = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertIn('posts_post_fts', sql)
+        self.assertNotIn('LIKE', sql)
+
+    def test_fts_query(self):
+        self.assertEqual(search.fts_query('Ёжики, в тумане!'),
+                         '"ежик"* "в" "туман"*')
+        self.assertEqual(search.fts_query(' "* '), '')
+
+
+EXPORT_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=EXPORT_MEDIA_ROOT)
+class ExportTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.image = os.urandom(export.CHUNK_SIZE * 3)
+        cls.user = User.objects.create_user(username='auth')
+        other = User.objects.create_user(username='other')
+        group = Group.objects.create(title='Группа', slug='group')
+        cls.post = Post.objects.create(
+            author=cls.user, text='Пост с картинкой', group=group,
+            image=SimpleUploadedFile('big.jpg', cls.image, 'image/jpeg'),
+        )
+        other_post = Post.objects.create(author=other, text='Чужой пост')
+        Comment.objects.create(post=other_post, author=cls.user, text='Мой')
+        Comment.objects.create(post=cls.post, author=other, text='Чужой')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(EXPORT_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_anonymous_is_redirected(self):
+        response = Client().get(reverse('posts:export'))
+        self.assertRedirects(
+            response, f'{reverse("users:login")}?next=/export/'
+        )
+
+    def test_streams_own_data(self):
+        response = self.client.get(reverse('posts:export'))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        chunks = list(response.streaming_content)
+        # Картинка уходит кусками, а не одним куском во весь архив.
+        self.assertLess(
+            max(map(len, chunks)), export.CHUNK_SIZE + 1024
+        )
+        archive = zipfile.ZipFile(BytesIO(b''.join(chunks)))
+        posts = [
+            json.loads(line)
+            for line in archive.read('posts.jsonl').splitlines()
+        ]
+        self.assertEqual(
+            [(post['text'], post['group']) for post in posts],
+            [('Пост с картинкой', 'group')],
+        )
+        comments = archive.read('comments.jsonl').decode()
+        self.assertIn('Мой', comments)
+        self.assertNotIn('Чужой', comments)
+        self.assertEqual(
+            archive.read(f'images/{self.post.image.name}'), self.image
+        )
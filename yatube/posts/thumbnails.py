@@ -0,0 +1,179 @@
+"""Миниатюры картинок постов, которые готовятся в фоне после загрузки."""
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from sorl.thumbnail import default, get_thumbnail
+
+from posts.cache import bump, post_namespaces
+from posts.models import Post, PostImageVariant
+
+logger = logging.getLogger(__name__)
+
+# Все геометрии, в которых шаблоны выводят картинку поста.
+THUMBNAILS = {
+    'padding': ('960x339', {'padding': True, 'upscale': True}),
+    'crop': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+
+_executor = None
+
+
+def _lock_key(name):
+    return f'thumbnails:{name}'
+
+
+def ready_thumbnail(image, kind):
+    """Готовая миниатюра `image` вида `kind` или None, если её ещё нет."""
+    geometry, options = THUMBNAILS[kind]
+    [thumbnail] = default.backend.get_ready_thumbnails(
+        [(image, geometry, options)]
+    )
+    return thumbnail
+
+
+def prefetch(posts):
+    """Находит готовые миниатюры всех постов страницы разом.
+
+    Каждому посту с картинкой проставляется `thumbnail_urls`: URL
+    миниатюры по виду или None, если она ещё не создана, и
+    `image_srcsets`: srcset WebP-вариантов по виду или пустая строка.
+    Миниатюры читаются одним обращением к хранилищу ключей, варианты —
+    одним запросом.
+    """
+    posts = [post for post in posts if post.image]
+    if not posts:
+        return
+    found = iter(default.backend.get_ready_thumbnails([
+        (post.image, geometry, options)
+        for post in posts
+        for geometry, options in THUMBNAILS.values()
+    ]))
+    for post in posts:
+        post.thumbnail_urls = {}
+        for kind in THUMBNAILS:
+            thumbnail = next(found)
+            post.thumbnail_urls[kind] = (
+                thumbnail.url if thumbnail is not None else None
+            )
+    rows = PostImageVariant.objects.filter(post__in=posts).order_by(
+        'width'
+    ).values_list('post', 'source', 'kind', 'width', 'name')
+    variants = defaultdict(list)
+    for post_id, source, kind, width, name in rows:
+        variants[post_id, source, kind].append(
+            f'{default.storage.url(name)} {width}w'
+        )
+    for post in posts:
+        post.image_srcsets = {
+            kind: ', '.join(variants[post.pk, post.image.name, kind])
+            for kind in THUMBNAILS
+        }
+
+
+def _variant_geometry(geometry, width):
+    # Варианты сохраняют пропорции основной миниатюры.
+    base_width, base_height = map(int, geometry.split('x'))
+    return f'{width}x{round(base_height * width / base_width)}'
+
+
+def _get_thumbnail(image, geometry, **options):
+    # Если исходник не читается, sorl пишет ошибку в лог и возвращает
+    # миниатюру, которой нет в хранилище ключей.
+    thumbnail = get_thumbnail(image, geometry, **options)
+    return thumbnail if default.kvstore.get(thumbnail) else None
+
+
+def generate(post):
+    """Создаёт миниатюры картинки поста и записывает её WebP-варианты.
+
+    Миниатюра в исходном формате остаётся запасной для браузеров без
+    WebP, варианты шириной `POST_IMAGE_WIDTHS` выводятся в srcset.
+    Возвращает False, если sorl не смог создать какую-то из миниатюр.
+    """
+    name = post.image.name
+    variants = []
+    for kind, (geometry, options) in THUMBNAILS.items():
+        # Ключ миниатюры sorl зависит от хранилища исходника, поэтому
+        # передаётся сам файл поля, а не его имя.
+        if _get_thumbnail(post.image, geometry, **options) is None:
+            return False
+        for width in settings.POST_IMAGE_WIDTHS:
+            thumbnail = _get_thumbnail(
+                post.image, _variant_geometry(geometry, width),
+                format='WEBP', **options
+            )
+            if thumbnail is None:
+                return False
+            variants.append(PostImageVariant(
+                post=post, source=name, kind=kind, width=width,
+                name=thumbnail.name,
+            ))
+    with transaction.atomic():
+        post.image_variants.all().delete()
+        PostImageVariant.objects.bulk_create(variants)
+    return True
+
+
+def _generate(name, post_id):
+    try:
+        post = Post.objects.filter(pk=post_id).first()
+        # Заменённую картинку готовит своя задача из очереди.
+        if post is not None and post.image.name == name:
+            if not generate(post):
+                logger.error('Не удалось подготовить миниатюры %s', name)
+                return
+            # Страницы с оригиналом вместо миниатюры пора пересобрать.
+            bump(post_namespaces(post))
+    except Exception:
+        logger.exception('Не удалось подготовить миниатюры %s', name)
+        return
+    # После ошибки блокировка живёт до конца `THUMBNAIL_TIMEOUT`: иначе
+    # каждый показ страницы с битой картинкой запускал бы её заново.
+    cache.delete(_lock_key(name))
+
+
+def _generate_in_worker(name, post_id):
+    try:
+        _generate(name, post_id)
+    finally:
+        # У потока-воркера своё соединение с БД, его нужно закрыть.
+        connection.close()
+
+
+def _in_background():
+    # Базу SQLite в памяти потоки не могут делить без блокировок таблиц,
+    # поэтому с ней, как и без воркеров, миниатюры готовятся на месте.
+    return settings.THUMBNAIL_WORKERS > 0 and not connection.is_in_memory_db()
+
+
+def schedule(post):
+    """Ставит миниатюры картинки поста в очередь фоновых воркеров.
+
+    Очередь пополняется после коммита транзакции, чтобы воркер видел
+    пост. Одна картинка стоит в очереди не больше одного раза. При
+    `THUMBNAIL_WORKERS` = 0 миниатюры готовятся сразу после коммита.
+    """
+    if not post.image:
+        return
+    name = post.image.name
+    post_id = post.pk
+
+    def submit():
+        global _executor
+        if not cache.add(_lock_key(name), True, settings.THUMBNAIL_TIMEOUT):
+            return
+        if not _in_background():
+            _generate(name, post_id)
+            return
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+        _executor.submit(_generate_in_worker, name, post_id)
+
+    transaction.on_commit(submit)
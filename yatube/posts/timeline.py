@@ -0,0 +1,148 @@
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Q
+
+from posts.models import Follow, PopularAuthor, Post, TimelineEntry
+
+
+def is_popular(author_id):
+    return PopularAuthor.objects.filter(author_id=author_id).exists()
+
+
+def _insert(entries):
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, settings.TIMELINE_BATCH_SIZE))
+        if not batch:
+            return
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора.
+
+    Если подписчиков больше `TIMELINE_FANOUT_LIMIT`, автор попадает в
+    `PopularAuthor`, и его посты дальше подмешиваются при чтении.
+    """
+    if is_popular(post.author_id):
+        return
+    followers = Follow.objects.filter(author_id=post.author_id)
+    if followers.count() > settings.TIMELINE_FANOUT_LIMIT:
+        PopularAuthor.objects.get_or_create(author_id=post.author_id)
+        return
+    _insert(
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post.pk,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        )
+        for user_id in followers.values_list('user_id', flat=True).iterator()
+    )
+
+
+def reassign(post):
+    """Перекладывает пост со сменённым автором в ленты подписчиков
+    нового автора."""
+    TimelineEntry.objects.filter(post_id=post.pk).delete()
+    fan_out(post)
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту пользователя посты автора, на которого он
+    подписался."""
+    if is_popular(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'pk', 'pub_date'
+    )
+    _insert(
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+        for post_id, pub_date in posts.iterator()
+    )
+
+
+def mark_popular_authors():
+    """Заносит в `PopularAuthor` всех, у кого подписчиков больше лимита."""
+    popular = (
+        Follow.objects.order_by().values('author_id')
+        .annotate(total=Count('pk'))
+        .filter(total__gt=settings.TIMELINE_FANOUT_LIMIT)
+        .values_list('author_id', flat=True)
+    )
+    PopularAuthor.objects.bulk_create(
+        [PopularAuthor(author_id=author_id) for author_id in popular],
+        ignore_conflicts=True,
+    )
+
+
+def rebuild(first_user_id, last_user_id):
+    """Раскладывает по лентам пользователей из диапазона id посты всех
+    их подписок одним INSERT ... SELECT.
+
+    Нужен после массовой загрузки в обход сигналов; по одному
+    `backfill` на подписку это заняло бы часы.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'''
+            INSERT INTO {TimelineEntry._meta.db_table}
+                (user_id, post_id, author_id, pub_date)
+            SELECT follow.user_id, post.id, post.author_id, post.pub_date
+            FROM {Follow._meta.db_table} follow
+            JOIN {Post._meta.db_table} post
+                ON post.author_id = follow.author_id
+            WHERE follow.user_id BETWEEN %s AND %s
+                AND follow.author_id NOT IN (
+                    SELECT author_id FROM {PopularAuthor._meta.db_table}
+                )
+            ON CONFLICT DO NOTHING
+            ''',
+            [first_user_id, last_user_id],
+        )
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты пользователя посты автора после отписки."""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def follow_feed_sources(user):
+    """Источники ленты подписок для `MergedCursorPaginator`.
+
+    Материализованная лента читается по индексу (user, pub_date), а
+    посты популярных авторов выбираются отдельно по их индексу.
+    """
+    popular_ids = list(
+        PopularAuthor.objects.filter(
+            author__following__user=user
+        ).values_list('author_id', flat=True)
+    )
+    posts = Post.objects.for_feed()
+    timeline = posts
+    if popular_ids:
+        timeline = timeline.exclude(author_id__in=popular_ids)
+    # Ключ берётся из строки ленты, чтобы идти по её индексу
+    # (user, pub_date, post) без сортировки. Условие на пользователя
+    # отдаётся паджинатору: оно должно стоять в одном filter() с
+    # курсором, иначе курсор попадёт на строки лент других подписчиков.
+    sources = [
+        (
+            timeline,
+            'timeline_entries__pub_date',
+            'timeline_entries__post__id',
+            Q(timeline_entries__user=user),
+        ),
+    ]
+    if popular_ids:
+        sources.append(
+            (posts.filter(author_id__in=popular_ids), 'pub_date', 'pk', None)
+        )
+    return sources
@@ -19,6 +19,11 @@ urlpatterns = [
         views.profile,
         name='profile'
     ),
+    path(
+        'search/',
+        views.search,
+        name='search'
+    ),
     path(
         'posts/<int:post_id>/',
         views.post_detail,
@@ -39,6 +44,11 @@ urlpatterns = [
         views.add_comment,
         name='add_comment'
     ),
+    path(
+        'export/',
+        views.export_data,
+        name='export'
+    ),
     path(
         'follow/',
         views.follow_index,
@@ -1,32 +1,41 @@
-from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
+from posts import export
+from posts.cache import (author_namespace, cache_feed, group_namespace,
+                         index_namespace, post_page_namespaces)
+from posts.counters import author_counters
+from posts.counts import group_count_key, index_count_key
 from posts.forms import CommentForm, PostForm
 from posts.models import Follow, Group, Post, User
+from posts.paginators import (legacy_page_redirect, paginate,
+                              paginate_search, paginate_sources)
+from posts.timeline import follow_feed_sources
 
 
-@cache_page(20)
+@cache_feed(lambda: [index_namespace()])
 def index(request):
     template = 'posts/index.html'
-    post_list = Post.objects.select_related('group')
-    paginator = Paginator(post_list, settings.ARTICLES_SELECTION)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.for_feed()
+    legacy_redirect = legacy_page_redirect(request, post_list)
+    if legacy_redirect:
+        return legacy_redirect
+    page_obj = paginate(request, post_list, index_count_key())
     context = {
         'page_obj': page_obj,
     }
     return render(request, template, context)
 
 
+@cache_feed(lambda slug: [group_namespace(slug)])
 def group_posts(request, slug):
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    paginator = Paginator(post_list, settings.ARTICLES_SELECTION)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = group.posts.for_feed()
+    legacy_redirect = legacy_page_redirect(request, post_list)
+    if legacy_redirect:
+        return legacy_redirect
+    page_obj = paginate(request, post_list, group_count_key(group.pk))
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -34,37 +43,43 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@cache_feed(lambda username: [author_namespace(username)])
 def profile(request, username):
     template = 'posts/profile.html'
-    user = request.user
     author = get_object_or_404(User, username=username)
-    following = (
-        user.is_authenticated
-        and Follow.objects.filter(user=user, author=author)
-    )
-    post_list = author.posts.all().order_by('author')
-    paginator = Paginator(post_list, settings.ARTICLES_SELECTION)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    post_number = post_list.count()
+    post_list = author.posts.for_feed()
+    legacy_redirect = legacy_page_redirect(request, post_list)
+    if legacy_redirect:
+        return legacy_redirect
+    page_obj = paginate(request, post_list)
+    counters = author_counters(author)
     context = {
         'page_obj': page_obj,
-        'post_number': post_number,
+        'post_number': counters.posts,
+        'counters': counters,
         'author': author,
-        'following': following,
     }
     return render(request, template, context)
 
 
+def search(request):
+    template = 'posts/search.html'
+    query = request.GET.get('q', '').strip()
+    context = {
+        'query': query,
+        'page_obj': paginate_search(request, query) if query else None,
+    }
+    return render(request, template, context)
+
+
+@cache_feed(post_page_namespaces)
 def post_detail(request, post_id):
     template = 'posts/post_detail.html'
-    post = get_object_or_404(Post, id=post_id)
-    post_list = Post.objects.select_related(
-        'group'
-    ).filter(
-        author_id=post.author
+    post = get_object_or_404(
+        Post.objects.for_feed(with_comments=True), id=post_id
     )
-    post_number = post_list.count()
+    post_list = Post.objects.for_feed().filter(author_id=post.author_id)
+    post_number = author_counters(post.author).posts
     form = CommentForm(request.POST or None)
     comments = post.comments.all()
     context = {
@@ -127,6 +142,19 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@login_required
+def export_data(request):
+    """Отдаёт zip-архив с постами, комментариями и картинками
+       пользователя, собирая его по ходу отправки."""
+    response = StreamingHttpResponse(
+        export.stream(request.user), content_type='application/zip'
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="yatube-{request.user.pk}.zip"'
+    )
+    return response
+
+
 @login_required
 def follow_index(request):
     """Выводит посты авторов, на которых
@@ -136,9 +164,10 @@ def follow_index(request):
     post_list = Post.objects.filter(
         author__following__user=user
     )
-    paginator = Paginator(post_list, settings.ARTICLES_SELECTION)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    legacy_redirect = legacy_page_redirect(request, post_list)
+    if legacy_redirect:
+        return legacy_redirect
+    page_obj = paginate_sources(request, follow_feed_sources(user))
     context = {
         'page_obj': page_obj
     }
@@ -1,4 +1,8 @@
+import atexit
 import os
+import shutil
+import sys
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -13,6 +17,9 @@ SECRET_KEY = 'c755=s26xpz!n*2b!1vo@i7b#q7-)ps*ymwea-bmvn!#&k-n!2'
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
+# Идут ли тесты: через manage.py test или pytest.
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+
 ALLOWED_HOSTS = [
     'localhost',
     '127.0.0.1',
@@ -41,6 +48,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ServerTimingMiddleware',
+    'core.middleware.QueryRepeatMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -143,11 +152,92 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+# Один файл кеша на сервер: его видят все процессы-воркеры.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache_backends.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'MAX_SIZE': 256 * 1024 * 1024,
+        },
     }
 }
+if TESTING:
+    # Тесты чистят кеш: у каждого запуска свой файл во временном
+    # каталоге, чтобы не стирать кеш разработчика и не мешать
+    # параллельным запускам. Каталог удаляется при выходе.
+    TEST_CACHE_DIR = tempfile.mkdtemp(prefix='yatube-cache-')
+    atexit.register(shutil.rmtree, TEST_CACHE_DIR, True)
+    CACHES['default']['LOCATION'] = os.path.join(
+        TEST_CACHE_DIR, 'cache.sqlite3'
+    )
 
 ARTICLES_SELECTION: int = 10
+# Страницы лент сбрасываются сигналами, поэтому могут жить долго.
+FEED_CACHE_TIMEOUT: int = 60 * 60 * 6
+# Ключ карточки поста меняется вместе с её содержимым, поэтому
+# срок жизни нужен только для вытеснения брошенных версий.
+POST_CARD_CACHE_TIMEOUT: int = 60 * 60 * 24 * 7
+# Сколько секунд после истечения можно отдавать старую страницу, пока
+# её пересобирает другой запрос, и сколько длится блокировка сборки.
+CACHE_STALE_GRACE: int = 60
+CACHE_REBUILD_LOCK_TIMEOUT: int = 10
+# Коэффициент вероятностного раннего обновления; 0 выключает его.
+CACHE_EARLY_REFRESH_BETA: float = 1.0
+# Сколько секунд живут оценки числа постов и через сколько
+# они пересчитываются в фоне.
+COUNT_ESTIMATE_TIMEOUT: int = 60 * 60 * 24
+COUNT_ESTIMATE_REFRESH: int = 60 * 10
+# До скольких записей в таблице админка считает строки точным COUNT(*).
+ADMIN_EXACT_COUNT_LIMIT: int = 10000
 FIRST_FIFTEEN_CHARS: int = 15
+# Посты авторов, у которых подписчиков больше этого числа, не
+# раскладываются по лентам при записи, а подмешиваются при чтении.
+TIMELINE_FANOUT_LIMIT: int = 1000
+TIMELINE_BATCH_SIZE: int = 500
+# Доля запросов, для которых считается Server-Timing и пишется строка
+# в лог core.timing.
+SERVER_TIMING_SAMPLE_RATE: float = 1.0 if DEBUG else 0.05
+THUMBNAIL_BACKEND = 'core.thumbnails.TimedThumbnailBackend'
+THUMBNAIL_KVSTORE = 'core.thumbnails.KVStore'
+# Сколько потоков готовят миниатюры в фоне и сколько секунд картинка
+# считается стоящей в очереди.
+THUMBNAIL_WORKERS: int = 2
+THUMBNAIL_TIMEOUT: int = 60 * 5
+# Ширины WebP-вариантов картинки поста для srcset.
+POST_IMAGE_WIDTHS: tuple = (320, 640, 960)
+# Доля запросов, проверяемых на N+1, и сколько одинаковых по форме
+# запросов за один запрос страницы ещё не считаются N+1.
+NPLUSONE_SAMPLE_RATE: float = 1.0 if DEBUG else 0.05
+NPLUSONE_THRESHOLD: int = 5
+
+# Строки JSON из core.timing и core.nplusone пишутся в stderr, откуда
+# их забирает сборщик логов. В тестах их тысячи, там они не выводятся.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'metrics': {
+            'class': (
+                'logging.NullHandler' if TESTING else 'logging.StreamHandler'
+            ),
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'core.timing': {
+            'handlers': ['metrics'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'core.nplusone': {
+            'handlers': ['metrics'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}